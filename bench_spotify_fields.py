@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Herramienta para medir el ahorro del modo ligero al importar playlists
+
+Descarga todas las páginas de una playlist dos veces, con la respuesta
+completa y con la proyección de campos y el mercado del modo ligero, e
+imprime los bytes transferidos (comprimidos, tal como viajan por la red),
+el tamaño del JSON ya descomprimido y el tiempo de análisis.
+
+Uso: python bench_spotify_fields.py <url de playlist>
+"""
+import sys
+import json
+import time
+from services.spotify_service import (get_spotify_client, _parse_spotify_url, _playlist_page_kwargs,
+                                      PLAYLIST_PAGE_SIZE)
+
+API_URL = "https://api.spotify.com/v1/playlists/{}/tracks"
+
+def measure_playlist(playlist_id, lean):
+    """
+    Descarga todas las páginas de una playlist y mide su tamaño y tiempo de análisis
+
+    Args:
+        playlist_id (str): ID de la playlist
+        lean (bool): Si se usa el modo ligero
+
+    Returns:
+        dict: Páginas, bytes por la red, bytes del JSON descomprimido, segundos de red
+            y segundos de análisis del JSON
+    """
+    sp = get_spotify_client()
+    token = sp.auth_manager.get_access_token(as_dict=False)
+    headers = {'Authorization': f"Bearer {token}"}
+
+    params = {'limit': PLAYLIST_PAGE_SIZE, 'offset': 0}
+    params.update(_playlist_page_kwargs(lean))
+
+    result = {'pages': 0, 'wire_bytes': 0, 'bytes': 0, 'network': 0.0, 'parse': 0.0}
+    total = None
+    while total is None or params['offset'] < total:
+        start = time.perf_counter()
+        # stream=True para poder leer del socket cuántos bytes llegaron antes de descomprimir
+        response = sp._session.get(API_URL.format(playlist_id), headers=headers, params=params, stream=True)
+        response.raise_for_status()
+        body = response.content
+        wire_bytes = response.raw.tell()
+        result['network'] += time.perf_counter() - start
+
+        start = time.perf_counter()
+        page = json.loads(body)
+        result['parse'] += time.perf_counter() - start
+
+        result['pages'] += 1
+        result['wire_bytes'] += wire_bytes
+        result['bytes'] += len(body)
+        total = page['total']
+        params['offset'] += PLAYLIST_PAGE_SIZE
+
+    return result
+
+def print_comparison(full, lean):
+    """Imprime la comparación entre ambos modos"""
+    print("\n" + "="*60)
+    print(f"{'':<12}{'Completo':>15}{'Ligero':>15}{'Ahorro':>15}")
+    print("-"*60)
+    print(f"{'Páginas':<12}{full['pages']:>15}{lean['pages']:>15}{'':>15}")
+
+    rows = [
+        ('KB red', full['wire_bytes'] / 1024, lean['wire_bytes'] / 1024),
+        ('KB JSON', full['bytes'] / 1024, lean['bytes'] / 1024),
+        ('Red (s)', full['network'], lean['network']),
+        ('JSON (s)', full['parse'], lean['parse']),
+    ]
+    for label, full_value, lean_value in rows:
+        factor = f"x{full_value / lean_value:.1f}" if lean_value else "-"
+        print(f"{label:<12}{full_value:>15.2f}{lean_value:>15.2f}{factor:>15}")
+    print("="*60 + "\n")
+
+def main():
+    """Función principal"""
+    if len(sys.argv) < 2:
+        print("Uso: python bench_spotify_fields.py <url de playlist>")
+        return
+
+    kind, playlist_id = _parse_spotify_url(sys.argv[1])
+    if kind != 'playlist':
+        print(f"Error: {sys.argv[1]} no es una URL de playlist de Spotify")
+        return
+
+    full = measure_playlist(playlist_id, lean=False)
+    lean = measure_playlist(playlist_id, lean=True)
+    print_comparison(full, lean)
+
+if __name__ == "__main__":
+    main()
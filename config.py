@@ -2,6 +2,11 @@
 Listify - Archivo de configuración
 """
 import os
+from dotenv import load_dotenv
+
+# Cargar el .env antes de leer cualquier ajuste: todos los módulos leen la
+# configuración de aquí, y al importarse este archivo ya tiene que estar cargado
+load_dotenv()
 
 # Credenciales de Spotify
 CLIENT_ID = os.getenv("CLIENT_ID")
@@ -11,4 +16,69 @@ CLIENT_SECRET = os.getenv("CLIENT_SECRET")
 SPOTIFY_GREEN = "#1DB954"
 SPOTIFY_BLACK = "#191414"
 SPOTIFY_DARK_GRAY = "#333333"
-SPOTIFY_LIGHT_GRAY = "#B3B3B3"
\ No newline at end of file
+SPOTIFY_LIGHT_GRAY = "#B3B3B3"
+
+# Conexiones con la API de Spotify
+# Número de hilos que lanzan peticiones a Spotify en paralelo (importación, búsqueda, detalles)
+SPOTIFY_MAX_WORKERS = int(os.getenv("SPOTIFY_MAX_WORKERS", "8"))
+
+# Caché local de respuestas de Spotify
+CACHE_DIR = os.getenv("LISTIFY_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".listify"))
+SPOTIFY_CACHE_ENABLED = os.getenv("SPOTIFY_CACHE_ENABLED", "1") == "1"
+# Segundos que se reutiliza el resultado de una búsqueda
+SPOTIFY_SEARCH_CACHE_TTL = int(os.getenv("SPOTIFY_SEARCH_CACHE_TTL", "3600"))
+
+# Milisegundos de espera tras seleccionar una pista antes de cargar sus detalles
+DETAILS_DEBOUNCE_MS = int(os.getenv("DETAILS_DEBOUNCE_MS", "150"))
+
+# Peticiones por segundo a Spotify compartidas por todos los hilos
+SPOTIFY_RATE_LIMIT = float(os.getenv("SPOTIFY_RATE_LIMIT", "10"))
+# Reintentos ante 429 o errores transitorios antes de dar la petición por fallida
+SPOTIFY_MAX_RETRIES = int(os.getenv("SPOTIFY_MAX_RETRIES", "5"))
+
+# Importación ligera: pedir solo los campos necesarios de cada pista
+SPOTIFY_LEAN_FETCH = os.getenv("SPOTIFY_LEAN_FETCH", "1") == "1"
+# Mercado para las peticiones (evita recibir las listas available_markets)
+SPOTIFY_MARKET = os.getenv("SPOTIFY_MARKET", "US")
+
+# Descargas
+# Número de pistas que se descargan a la vez (etapa de red del pipeline)
+DOWNLOAD_WORKERS = int(os.getenv("DOWNLOAD_WORKERS", "8"))
+NETWORK_WORKERS = DOWNLOAD_WORKERS
+# Conversiones con ffmpeg simultáneas (núcleos que se dedican a convertir)
+TRANSCODE_WORKERS = int(os.getenv("TRANSCODE_WORKERS", str(os.cpu_count() or 2)))
+# Prioridad (nice) de los procesos de ffmpeg; 0 los deja con la prioridad normal
+TRANSCODE_NICE = int(os.getenv("TRANSCODE_NICE", "10"))
+# Escribir etiquetas y portada del MP3 en la misma pasada de ffmpeg que lo convierte
+SINGLE_PASS_TAGGING = os.getenv("SINGLE_PASS_TAGGING", "1") == "1"
+# Bytes de relleno que se reservan tras las etiquetas para poder reescribirlas sin mover el audio
+ID3_PADDING = int(os.getenv("ID3_PADDING", str(128 * 1024)))
+# Archivos que se etiquetan a la vez
+TAG_WORKERS = int(os.getenv("TAG_WORKERS", "2"))
+# Capacidad de las colas entre etapas
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "16"))
+# Búsquedas en YouTube simultáneas y pistas que se buscan por adelantado
+SEARCH_WORKERS = int(os.getenv("SEARCH_WORKERS", "4"))
+SEARCH_LOOKAHEAD = int(os.getenv("SEARCH_LOOKAHEAD", "16"))
+# Ejecutable de ffmpeg
+FFMPEG_PATH = os.getenv("FFMPEG_PATH", "ffmpeg")
+# Formato de salida: "mp3" convierte a MP3 de 320 kbps; "opus" y "m4a" guardan el
+# audio original de YouTube en su contenedor, sin volver a codificarlo
+OUTPUT_FORMAT = os.getenv("OUTPUT_FORMAT", "mp3").lower()
+
+# Caché de portadas ya procesadas (en memoria y en CACHE_DIR/covers)
+COVER_CACHE_ENABLED = os.getenv("COVER_CACHE_ENABLED", "1") == "1"
+# Portadas que se mantienen en memoria
+COVER_CACHE_MEMORY_SIZE = int(os.getenv("COVER_CACHE_MEMORY_SIZE", "64"))
+
+# Caché de coincidencias pista -> video de YouTube
+YOUTUBE_MATCH_CACHE_ENABLED = os.getenv("YOUTUBE_MATCH_CACHE_ENABLED", "1") == "1"
+YOUTUBE_MATCH_CACHE_SIZE = int(os.getenv("YOUTUBE_MATCH_CACHE_SIZE", "50000"))
+# Días que se conserva una coincidencia antes de volver a buscar (0 = sin límite)
+YOUTUBE_MATCH_TTL_DAYS = int(os.getenv("YOUTUBE_MATCH_TTL_DAYS", "90"))
+
+# Selección del video de YouTube
+# Resultados que se comparan por cada pista
+MATCH_CANDIDATES = int(os.getenv("MATCH_CANDIDATES", "8"))
+# Puntuación mínima (0-1) para aceptar un video
+MATCH_MIN_SCORE = float(os.getenv("MATCH_MIN_SCORE", "0.45"))
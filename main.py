@@ -4,12 +4,9 @@
 Listify - Punto de entrada principal
 """
 import tkinter as tk
-from dotenv import load_dotenv
+# config carga el .env al importarse, antes que cualquier otro módulo de la aplicación
 from ui.app import ListifyApp
 
-# Cargar variables de entorno
-load_dotenv()
-
 def main():
     """Función principal que inicia la aplicación"""
     root = tk.Tk()
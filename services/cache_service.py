@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Listify - Servicio de caché local en SQLite
+"""
+import os
+import json
+import time
+import sqlite3
+import threading
+from config import CACHE_DIR, YOUTUBE_MATCH_CACHE_SIZE, YOUTUBE_MATCH_TTL_DAYS
+
+class ResponseCache:
+    """Caché persistente de respuestas en una base de datos SQLite"""
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        
+        # Una única conexión compartida entre hilos, protegida por el lock
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        with self._lock:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, "
+                "version TEXT, "
+                "value TEXT NOT NULL, "
+                "updated_at REAL NOT NULL)"
+            )
+            self._conn.commit()
+    
+    def get(self, key, max_age=None):
+        """
+        Obtiene un valor de la caché
+        
+        Args:
+            key (str): Clave del valor
+            max_age (float, optional): Antigüedad máxima en segundos. Sin límite si es None.
+        
+        Returns:
+            tuple: (valor, versión) o (None, None) si no existe o ha caducado
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, version, updated_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+        
+        if row is None:
+            return None, None
+        
+        value, version, updated_at = row
+        if max_age is not None and time.time() - updated_at > max_age:
+            return None, None
+        
+        return json.loads(value), version
+    
+    def set(self, key, value, version=None):
+        """
+        Guarda un valor en la caché
+        
+        Args:
+            key (str): Clave del valor
+            value: Valor serializable a JSON
+            version (str, optional): Versión del recurso (p. ej. snapshot_id de una playlist)
+        """
+        data = json.dumps(value, ensure_ascii=False)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, version, value, updated_at) VALUES (?, ?, ?, ?)",
+                (key, version, data, time.time())
+            )
+            self._conn.commit()
+    
+    def delete(self, key):
+        """
+        Elimina un valor de la caché
+        
+        Args:
+            key (str): Clave del valor
+        """
+        with self._lock:
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._conn.commit()
+    
+    def clear(self):
+        """Vacía la caché"""
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+class YouTubeMatchCache:
+    """Caché persistente de la correspondencia entre pistas y videos de YouTube"""
+    def __init__(self, db_path, max_entries=YOUTUBE_MATCH_CACHE_SIZE, ttl_days=YOUTUBE_MATCH_TTL_DAYS):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.ttl = ttl_days * 86400 if ttl_days else None
+        self._lock = threading.Lock()
+        
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        with self._lock:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS matches ("
+                "key TEXT PRIMARY KEY, "
+                "video_id TEXT NOT NULL, "
+                "score REAL, "
+                "created_at REAL NOT NULL, "
+                "last_used REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS matches_last_used ON matches (last_used)")
+            self._conn.commit()
+    
+    def get(self, key):
+        """
+        Obtiene el video asociado a una pista
+        
+        Args:
+            key (str): Clave de la pista (ver services.track.track_key)
+        
+        Returns:
+            tuple: (video_id, puntuación) o (None, None) si no existe o ha caducado
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT video_id, score, created_at FROM matches WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None, None
+            
+            video_id, score, created_at = row
+            if self.ttl is not None and now - created_at > self.ttl:
+                self._conn.execute("DELETE FROM matches WHERE key = ?", (key,))
+                self._conn.commit()
+                return None, None
+            
+            self._conn.execute("UPDATE matches SET last_used = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+        return video_id, score
+    
+    def set(self, key, video_id, score=None):
+        """
+        Guarda el video elegido para una pista, expulsando los menos usados si se llena
+        
+        Args:
+            key (str): Clave de la pista
+            video_id (str): ID del video de YouTube
+            score (float, optional): Puntuación de la coincidencia
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO matches (key, video_id, score, created_at, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, video_id, score, now, now)
+            )
+            count = self._conn.execute("SELECT COUNT(*) FROM matches").fetchone()[0]
+            if self.max_entries and count > self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM matches WHERE key IN "
+                    "(SELECT key FROM matches ORDER BY last_used ASC LIMIT ?)",
+                    (count - self.max_entries,)
+                )
+            self._conn.commit()
+    
+    def invalidate(self, key):
+        """
+        Olvida el video de una pista (p. ej. porque ya no se puede descargar)
+        
+        Args:
+            key (str): Clave de la pista
+        """
+        with self._lock:
+            self._conn.execute("DELETE FROM matches WHERE key = ?", (key,))
+            self._conn.commit()
+    
+    def clear(self):
+        """Vacía la caché"""
+        with self._lock:
+            self._conn.execute("DELETE FROM matches")
+            self._conn.commit()
+
+_spotify_cache = None
+_spotify_cache_lock = threading.Lock()
+_match_cache = None
+_match_cache_lock = threading.Lock()
+
+def get_spotify_cache():
+    """
+    Obtiene la caché de respuestas de Spotify compartida por el proceso
+    
+    Returns:
+        ResponseCache: Caché de respuestas de Spotify
+    """
+    global _spotify_cache
+    
+    if _spotify_cache is None:
+        with _spotify_cache_lock:
+            if _spotify_cache is None:
+                _spotify_cache = ResponseCache(os.path.join(CACHE_DIR, "spotify_cache.sqlite"))
+    return _spotify_cache
+
+
+def get_youtube_match_cache():
+    """
+    Obtiene la caché de coincidencias de YouTube compartida por el proceso
+    
+    Returns:
+        YouTubeMatchCache: Caché de coincidencias
+    """
+    global _match_cache
+    
+    if _match_cache is None:
+        with _match_cache_lock:
+            if _match_cache is None:
+                _match_cache = YouTubeMatchCache(os.path.join(CACHE_DIR, "youtube_matches.sqlite"))
+    return _match_cache
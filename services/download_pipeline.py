@@ -0,0 +1,388 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Listify - Pipeline de descarga por etapas
+"""
+import os
+import time
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from config import (NETWORK_WORKERS, TRANSCODE_WORKERS, TAG_WORKERS, PIPELINE_QUEUE_SIZE,
+                    SEARCH_WORKERS, SEARCH_LOOKAHEAD)
+from services.manifest_service import get_manifest
+from services.track import track_key
+from services.metadata_service import get_basic_metadata, get_audio_length, is_valid_audio_file
+from services.youtube_service import (YoutubeDLSession, find_youtube_video, forget_youtube_video,
+                                      discard_partial_downloads,
+                                      get_output_file, get_staging_dir, fetch_audio_stream,
+                                      convert_audio, tag_audio_file, writes_tags_on_convert,
+                                      write_cover_file)
+
+# Marca de fin de trabajo para los hilos de cada etapa
+_DONE = object()
+
+class DownloadJob:
+    """Estado de una pista a lo largo del pipeline"""
+    __slots__ = ('index', 'track', 'video_url', 'from_cache', 'name', 'output_file', 'raw_file',
+                 'metadata', 'cover_file', 'tagged', 'error')
+
+    def __init__(self, index, track):
+        self.index = index
+        self.track = track
+        self.video_url = None
+        self.from_cache = False
+        self.name = None
+        self.output_file = None
+        self.raw_file = None
+        self.metadata = None
+        self.cover_file = None
+        self.tagged = False
+        self.error = None
+
+    def __str__(self):
+        return str(self.track)
+
+class _Stage:
+    """Etapa del pipeline: un grupo de hilos que consume de una cola y alimenta la siguiente"""
+    def __init__(self, name, func, workers, input_queue, output_queue, pipeline):
+        self.name = name
+        self.func = func
+        self.workers = max(1, workers)
+        self.input_queue = input_queue
+        self.output_queue = output_queue
+        self.pipeline = pipeline
+        self.next_stage = None
+
+        self._alive = self.workers
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def start(self):
+        """Arranca los hilos de la etapa"""
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"{self.name}-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _run(self):
+        """Procesa trabajos hasta recibir la marca de fin"""
+        while True:
+            job = self.input_queue.get()
+            if job is _DONE:
+                break
+
+            self.pipeline._notify(self.name, job)
+            try:
+                ok = self.func(job)
+            except Exception as e:
+                job.error = str(e)
+                ok = False
+
+            if not ok:
+                self.pipeline._finish(job, False)
+            elif self.output_queue is None:
+                self.pipeline._finish(job, True)
+            else:
+                # La cola acotada frena esta etapa si la siguiente va por detrás
+                self.output_queue.put(job)
+
+        # El último hilo en salir avisa a todos los hilos de la etapa siguiente
+        with self._lock:
+            self._alive -= 1
+            last = self._alive == 0
+        if last and self.next_stage is not None:
+            for _ in range(self.next_stage.workers):
+                self.output_queue.put(_DONE)
+
+class DownloadPipeline:
+    """
+    Pipeline de descarga con una etapa por tipo de trabajo
+
+    Red (búsqueda y descarga con yt-dlp), conversión (ffmpeg) y etiquetado
+    (mutagen) tienen su propio número de hilos y se comunican por colas
+    acotadas, de modo que la red sigue descargando mientras ffmpeg ocupa
+    todos los núcleos y el etiquetado escribe en disco.
+    """
+    def __init__(self, destino, cover_url=None, album_name=None, on_event=None,
+                 network_workers=NETWORK_WORKERS, transcode_workers=TRANSCODE_WORKERS,
+                 tag_workers=TAG_WORKERS, queue_size=PIPELINE_QUEUE_SIZE,
+                 search_workers=SEARCH_WORKERS, lookahead=SEARCH_LOOKAHEAD, source=None):
+        """
+        Args:
+            destino (str): Carpeta destino
+            cover_url (str, optional): URL de la portada si la pista no trae la suya
+            album_name (str, optional): Nombre del álbum si la pista no trae el suyo
+            on_event (callable, optional): Función (evento, trabajo) que recibe el avance;
+                los eventos son 'search', el nombre de cada etapa, 'done' y 'failed'
+            network_workers (int, optional): Descargas simultáneas
+            transcode_workers (int, optional): Conversiones simultáneas
+            tag_workers (int, optional): Etiquetados simultáneos
+            queue_size (int, optional): Capacidad de las colas entre etapas
+            search_workers (int, optional): Búsquedas en YouTube simultáneas
+            lookahead (int, optional): Pistas que se buscan por adelantado
+            source (str, optional): Playlist o álbum de origen que se anota en el manifiesto
+        """
+        self.destino = os.path.normpath(destino)
+        self.cover_url = cover_url
+        self.album_name = album_name
+        self.on_event = on_event
+        self.source = source
+        self.search_workers = max(1, search_workers)
+        self.lookahead = max(1, lookahead)
+
+        # Una instancia de YoutubeDL por hilo de red durante todo el lote
+        self.session = YoutubeDLSession()
+
+        # Pistas ya descargadas en esta carpeta
+        self.manifest = get_manifest(self.destino)
+
+        self.ok = 0
+        self.failed = 0
+        self.skipped = 0
+        self._lock = threading.Lock()
+        self._finished = threading.Event()
+        self._pending = 0
+        
+        # Rendimiento de la etapa de conversión
+        self.transcoded = 0
+        self.transcoded_seconds = 0.0
+        self._transcode_started = None
+        self._transcode_finished = None
+
+        network_queue = queue.Queue(maxsize=queue_size)
+        transcode_queue = queue.Queue(maxsize=queue_size)
+        tag_queue = queue.Queue(maxsize=queue_size)
+
+        self.stages = [
+            _Stage('network', self._network, network_workers, network_queue, transcode_queue, self),
+            _Stage('transcode', self._transcode, transcode_workers, transcode_queue, tag_queue, self),
+            _Stage('tag', self._tag, tag_workers, tag_queue, None, self),
+        ]
+        for stage, next_stage in zip(self.stages, self.stages[1:]):
+            stage.next_stage = next_stage
+
+    # ===== ETAPAS =====
+
+    def _search(self, job):
+        """Busca la pista en YouTube (o la toma de la caché) antes de que le toque descargarse"""
+        self._notify('search', job)
+        try:
+            job.video_url, job.from_cache = find_youtube_video(job.track)
+        except Exception as e:
+            job.error = str(e)
+        if not job.video_url and not job.error:
+            job.error = "No se encontró en YouTube"
+
+    def _network(self, job):
+        """Descarga el audio del video ya encontrado, sin convertir"""
+        video_url, from_cache = job.video_url, job.from_cache
+
+        job.name, job.output_file = get_output_file(self.destino, job.track)
+        if os.path.exists(job.output_file):
+            os.remove(job.output_file)
+
+        job.raw_file = self._fetch(video_url, job)
+        if not job.raw_file and from_cache:
+            # El video guardado ya no sirve: olvidarlo (con su descarga a medias) y buscar de nuevo
+            forget_youtube_video(job.track)
+            discard_partial_downloads(get_staging_dir(self.destino), job.name, video_url)
+            video_url, _ = find_youtube_video(job.track, use_cache=False)
+            if video_url:
+                job.raw_file = self._fetch(video_url, job)
+
+        if not job.raw_file:
+            job.error = job.error or "No se pudo descargar el audio"
+            return False
+        
+        if writes_tags_on_convert(job.output_file):
+            # La portada se descarga aquí, junto al resto del trabajo de red, y
+            # ffmpeg la incrusta con las etiquetas en la etapa de conversión
+            job.metadata = get_basic_metadata(job.track, self.cover_url, self.album_name)
+            job.cover_file = write_cover_file(job.metadata.get('cover_url'), get_staging_dir(self.destino), job.name)
+            job.tagged = True
+        return True
+
+    def _fetch(self, video_url, job):
+        """Descarga el audio de un video, devolviendo None si falla"""
+        try:
+            return fetch_audio_stream(video_url, get_staging_dir(self.destino), job.name, self.session)
+        except Exception as e:
+            job.error = str(e)
+            return None
+
+    def _transcode(self, job):
+        """Convierte el audio descargado a MP3 o lo copia a su contenedor final"""
+        started = time.monotonic()
+        if not convert_audio(job.raw_file, job.output_file, job.metadata, job.cover_file):
+            job.error = "Error al convertir el audio"
+            return False
+        
+        length = get_audio_length(job.output_file)
+        with self._lock:
+            if self._transcode_started is None or started < self._transcode_started:
+                self._transcode_started = started
+            self._transcode_finished = time.monotonic()
+            self.transcoded += 1
+            self.transcoded_seconds += length
+        return True
+
+    def _tag(self, job):
+        """Añade los metadatos al archivo de audio (o solo lo valida si ffmpeg ya los escribió)"""
+        if job.tagged:
+            valid = is_valid_audio_file(job.output_file)
+        else:
+            job.metadata = get_basic_metadata(job.track, self.cover_url, self.album_name)
+            valid = tag_audio_file(job.output_file, job.metadata)
+        
+        if not valid:
+            job.error = "Archivo descargado no válido"
+            return False
+
+        self.manifest.record(job.track, job.output_file, self.source)
+        return True
+
+    # ===== CONTROL =====
+
+    def _notify(self, event, job):
+        """Informa del avance de un trabajo"""
+        if self.on_event:
+            try:
+                self.on_event(event, job)
+            except Exception as e:
+                print(f"Error al notificar el progreso: {e}")
+
+    def transcode_throughput(self):
+        """
+        Calcula el rendimiento de la etapa de conversión
+        
+        Se mide sobre el tiempo real entre la primera conversión y la última,
+        con todos los procesos de ffmpeg trabajando a la vez.
+        
+        Returns:
+            tuple: (pistas por minuto, segundos de audio por segundo real)
+        """
+        with self._lock:
+            if not self.transcoded:
+                return 0.0, 0.0
+            elapsed = max(self._transcode_finished - self._transcode_started, 1e-6)
+            return self.transcoded * 60 / elapsed, self.transcoded_seconds / elapsed
+    
+    def _existing_file(self, job):
+        """
+        Comprueba si la pista ya está descargada en la carpeta
+
+        Primero se consulta el manifiesto; un archivo con el nombre esperado
+        que no figure en él (descargado antes de existir el manifiesto) se
+        valida y se incorpora.
+
+        Returns:
+            str: Ruta del archivo existente o None si hay que descargarla
+        """
+        file_path = self.manifest.get_file(job.track)
+        if file_path:
+            self.manifest.add_source(job.track, self.source)
+            return file_path
+
+        _, output_file = get_output_file(self.destino, job.track)
+        if is_valid_audio_file(output_file):
+            self.manifest.record(job.track, output_file, self.source)
+            return output_file
+        return None
+
+    def _finish(self, job, success, skipped=False):
+        """Registra el resultado final de un trabajo"""
+        with self._lock:
+            if skipped:
+                self.skipped += 1
+            elif success:
+                self.ok += 1
+            else:
+                self.failed += 1
+            self._pending -= 1
+            finished = self._pending == 0
+
+        self._notify('skipped' if skipped else 'done' if success else 'failed', job)
+        if finished:
+            self._finished.set()
+
+    def run(self, tracks):
+        """
+        Procesa todas las pistas y espera a que terminen
+
+        Args:
+            tracks (list): Pistas (Track o texto "título - artistas")
+
+        Returns:
+            tuple: (correctas, fallidas); las que ya existían quedan en self.skipped
+        """
+        tracks = list(tracks)
+        if not tracks:
+            return 0, 0
+
+        self._pending = len(tracks)
+        self._finished.clear()
+        for stage in self.stages:
+            stage.start()
+
+        try:
+            self._feed(tracks)
+            self._finished.wait()
+        finally:
+            self.session.close()
+            self.manifest.save()
+        return self.ok, self.failed
+
+    def _feed(self, tracks):
+        """
+        Alimenta la etapa de red con pistas ya buscadas
+
+        Las búsquedas corren en su propio pool y van `lookahead` pistas por
+        delante, así que los hilos de red reciben la URL resuelta y no
+        esperan a YouTube.
+
+        Las pistas repetidas (misma clave o mismo archivo de salida) se dan
+        por descargadas: compartirían nombre en la carpeta temporal y en el
+        destino, y dos descargas simultáneas se pisarían los archivos.
+        """
+        first = self.stages[0]
+        pending = iter(enumerate(tracks))
+        window = deque()
+        seen = set()
+
+        with ThreadPoolExecutor(max_workers=self.search_workers) as search_pool:
+            def submit_next():
+                for item in pending:
+                    job = DownloadJob(*item)
+                    _, output_file = get_output_file(self.destino, job.track)
+                    claims = (track_key(job.track), os.path.normcase(output_file))
+                    if seen.intersection(claims):
+                        # Repetida en la lista: la descarga ya la hace su primera aparición
+                        self._finish(job, True, skipped=True)
+                        continue
+                    seen.update(claims)
+
+                    if self._existing_file(job):
+                        # Ya descargada y válida: no se busca ni se descarga
+                        self._finish(job, True, skipped=True)
+                        continue
+                    window.append((job, search_pool.submit(self._search, job)))
+                    return
+
+            for _ in range(self.lookahead):
+                submit_next()
+
+            while window:
+                job, future = window.popleft()
+                submit_next()
+                future.result()
+
+                if job.video_url:
+                    # La cola acotada detiene la entrega si la red va por detrás
+                    first.input_queue.put(job)
+                else:
+                    self._finish(job, False)
+
+        for _ in range(first.workers):
+            first.input_queue.put(_DONE)
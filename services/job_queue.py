@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Listify - Cola persistente de trabajos de descarga
+"""
+import os
+import json
+import time
+import sqlite3
+import threading
+from config import CACHE_DIR
+from services.track import Track
+
+# Estados de cada pista dentro de un trabajo
+PENDING = 'pending'
+SEARCHING = 'searching'
+DOWNLOADING = 'downloading'
+TRANSCODING = 'transcoding'
+TAGGING = 'tagging'
+DONE = 'done'
+FAILED = 'failed'
+
+FINAL_STATES = (DONE, FAILED)
+
+class DownloadJobQueue:
+    """
+    Cola de trabajos de descarga guardada en SQLite
+
+    Cada trabajo registra su carpeta destino y el estado de cada pista, de
+    modo que si la aplicación se cierra o falla a mitad de una lista, al
+    volver a abrirla se retoman solo las pistas que no terminaron.
+    """
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        with self._lock:
+            # WAL: cada cambio de estado es una escritura pequeña que sobrevive a un cierre brusco
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                "destino TEXT NOT NULL, "
+                "cover_url TEXT, "
+                "album_name TEXT, "
+                "source TEXT, "
+                "created_at REAL NOT NULL, "
+                "finished_at REAL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS job_tracks ("
+                "job_id INTEGER NOT NULL, "
+                "position INTEGER NOT NULL, "
+                "track TEXT NOT NULL, "
+                "state TEXT NOT NULL, "
+                "error TEXT, "
+                "PRIMARY KEY (job_id, position))"
+            )
+            # Colas creadas antes de guardar el origen de cada trabajo
+            try:
+                self._conn.execute("ALTER TABLE jobs ADD COLUMN source TEXT")
+            except sqlite3.OperationalError:
+                pass
+            # Trabajos terminados que quedaran de ejecuciones anteriores
+            self._conn.execute(
+                "DELETE FROM job_tracks WHERE job_id IN (SELECT id FROM jobs WHERE finished_at IS NOT NULL)"
+            )
+            self._conn.execute("DELETE FROM jobs WHERE finished_at IS NOT NULL")
+            self._conn.commit()
+
+    def create_job(self, tracks, destino, cover_url=None, album_name=None, source=None):
+        """
+        Registra un trabajo nuevo con todas sus pistas pendientes
+
+        Args:
+            tracks (list): Pistas (Track o texto)
+            destino (str): Carpeta destino
+            cover_url (str, optional): URL de la portada
+            album_name (str, optional): Nombre del álbum
+            source (str, optional): Playlist o álbum de origen
+
+        Returns:
+            int: ID del trabajo
+        """
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO jobs (destino, cover_url, album_name, source, created_at) VALUES (?, ?, ?, ?, ?)",
+                (destino, cover_url, album_name, source, time.time())
+            )
+            job_id = cursor.lastrowid
+            self._conn.executemany(
+                "INSERT INTO job_tracks (job_id, position, track, state) VALUES (?, ?, ?, ?)",
+                [(job_id, position, _dump_track(track), PENDING) for position, track in enumerate(tracks)]
+            )
+            self._conn.commit()
+        return job_id
+
+    def set_state(self, job_id, position, state, error=None):
+        """
+        Actualiza el estado de una pista
+
+        Args:
+            job_id (int): ID del trabajo
+            position (int): Posición de la pista en el trabajo
+            state (str): Nuevo estado
+            error (str, optional): Motivo del fallo
+        """
+        with self._lock:
+            self._conn.execute(
+                "UPDATE job_tracks SET state = ?, error = ? WHERE job_id = ? AND position = ?",
+                (state, error, job_id, position)
+            )
+            self._conn.commit()
+
+    def finish_job(self, job_id):
+        """
+        Da un trabajo por terminado y lo elimina de la cola
+
+        Args:
+            job_id (int): ID del trabajo
+        """
+        with self._lock:
+            self._conn.execute("DELETE FROM job_tracks WHERE job_id = ?", (job_id,))
+            self._conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+            self._conn.commit()
+
+    def unfinished_jobs(self):
+        """
+        Obtiene los trabajos que quedaron a medias
+
+        Returns:
+            list: Diccionarios con id, destino, cover_url, album_name, source, positions y
+                tracks (solo las pistas que no llegaron a un estado final)
+        """
+        with self._lock:
+            jobs = self._conn.execute(
+                "SELECT id, destino, cover_url, album_name, source FROM jobs WHERE finished_at IS NULL ORDER BY id"
+            ).fetchall()
+            result = []
+            for job_id, destino, cover_url, album_name, source in jobs:
+                rows = self._conn.execute(
+                    "SELECT position, track FROM job_tracks "
+                    "WHERE job_id = ? AND state NOT IN (?, ?) ORDER BY position",
+                    (job_id, *FINAL_STATES)
+                ).fetchall()
+                result.append({
+                    'id': job_id,
+                    'destino': destino,
+                    'cover_url': cover_url,
+                    'album_name': album_name,
+                    'source': source,
+                    'positions': [position for position, _ in rows],
+                    'tracks': [_load_track(track) for _, track in rows]
+                })
+        return result
+
+def _dump_track(track):
+    """Serializa una pista para guardarla en la cola"""
+    if isinstance(track, Track):
+        return json.dumps(track.to_dict(), ensure_ascii=False)
+    return json.dumps(str(track), ensure_ascii=False)
+
+def _load_track(data):
+    """Reconstruye una pista guardada con _dump_track"""
+    value = json.loads(data)
+    return Track.from_dict(value) if isinstance(value, dict) else value
+
+_job_queue = None
+_job_queue_lock = threading.Lock()
+
+def get_job_queue():
+    """
+    Obtiene la cola de trabajos compartida por el proceso
+
+    Returns:
+        DownloadJobQueue: Cola de trabajos
+    """
+    global _job_queue
+
+    if _job_queue is None:
+        with _job_queue_lock:
+            if _job_queue is None:
+                _job_queue = DownloadJobQueue(os.path.join(CACHE_DIR, "jobs.sqlite"))
+    return _job_queue
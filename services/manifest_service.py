@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Listify - Manifiesto de descargas por carpeta
+"""
+import os
+import json
+import time
+import hashlib
+import threading
+from services.track import track_key
+
+MANIFEST_FILENAME = '.listify_manifest.json'
+
+# Segundos mínimos entre dos escrituras del manifiesto mientras se registran pistas;
+# cada escritura guarda el manifiesto entero, así que no se hace por cada registro
+SAVE_INTERVAL_SECONDS = 5
+
+class DownloadManifest:
+    """
+    Registro de las pistas ya descargadas en una carpeta
+
+    Guarda por cada pista (según services.track.track_key) la ruta relativa
+    del archivo, su tamaño y su hash, de modo que una nueva descarga de la
+    misma lista puede saltarse en O(1) las pistas que ya están completas.
+    También guarda de qué playlists o álbumes ('sources') se descargó cada
+    pista, para que la sincronización de una lista solo considere las suyas.
+    """
+    def __init__(self, folder):
+        self.folder = os.path.normpath(folder)
+        self.path = os.path.join(self.folder, MANIFEST_FILENAME)
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._unsaved = 0
+        self._last_save = time.monotonic()
+        self.entries = self._load()
+
+    def _load(self):
+        """Lee el manifiesto de disco; si no existe o está dañado empieza vacío"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return data.get('tracks', {})
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            print(f"Manifiesto dañado en {self.path}, se crea uno nuevo: {e}")
+            return {}
+
+    def save(self):
+        """Escribe el manifiesto de forma atómica"""
+        # Un solo guardado a la vez: todos comparten el archivo temporal
+        with self._save_lock:
+            with self._lock:
+                data = json.dumps({'version': 1, 'tracks': self.entries}, ensure_ascii=False,
+                                  separators=(',', ':'))
+                self._unsaved = 0
+                self._last_save = time.monotonic()
+
+            os.makedirs(self.folder, exist_ok=True)
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                f.write(data)
+            os.replace(temp_path, self.path)
+
+    def get_file(self, track, verify_hash=False):
+        """
+        Devuelve el archivo de una pista si ya se descargó y sigue siendo válido
+
+        Por defecto solo se comprueba que el archivo exista con el tamaño
+        registrado; verify_hash recalcula además su hash.
+
+        Args:
+            track (Track | str): Pista
+            verify_hash (bool, optional): Comprobar también el contenido
+
+        Returns:
+            str: Ruta del archivo o None si falta, está dañado o no se registró
+        """
+        with self._lock:
+            entry = self.entries.get(track_key(track))
+        if not entry:
+            return None
+
+        file_path = os.path.join(self.folder, entry['path'])
+        try:
+            if os.path.getsize(file_path) != entry['size']:
+                return None
+        except OSError:
+            return None
+
+        # Sin hash registrado (p. ej. tras reetiquetar en el sitio) solo cuenta el tamaño
+        if verify_hash and entry.get('sha1') and file_hash(file_path) != entry['sha1']:
+            return None
+        return file_path
+
+    def record(self, track, file_path, source=None):
+        """
+        Registra una pista como descargada
+
+        Args:
+            track (Track | str): Pista
+            file_path (str): Archivo final de la pista
+            source (str, optional): Playlist o álbum de origen (ver spotify_service.get_source_key)
+        """
+        key = track_key(track)
+        entry = {
+            'path': os.path.relpath(file_path, self.folder),
+            'size': os.path.getsize(file_path),
+            'sha1': file_hash(file_path),
+            'title': str(track),
+            'completed_at': int(time.time())
+        }
+        with self._lock:
+            # Conservar los orígenes de un registro anterior de la misma pista
+            sources = list((self.entries.get(key) or {}).get('sources', []))
+            if source and source not in sources:
+                sources.append(source)
+            if sources:
+                entry['sources'] = sources
+            self.entries[key] = entry
+            self._unsaved += 1
+            pending_save = time.monotonic() - self._last_save >= SAVE_INTERVAL_SECONDS
+
+        if pending_save:
+            self.save()
+
+    def update_file(self, track, file_path, rehash=False):
+        """
+        Actualiza el tamaño (y opcionalmente el hash) de una pista ya registrada
+
+        A diferencia de record no lee el archivo completo salvo que se pida
+        rehash, ni guarda el manifiesto: se usa al reetiquetar, donde solo
+        cambia la cabecera, y el llamador guarda una vez al terminar.
+
+        Args:
+            track (Track | str): Pista
+            file_path (str): Archivo de la pista
+            rehash (bool, optional): Recalcular el hash; si no, se descarta el anterior
+        """
+        size = os.path.getsize(file_path)
+        sha1 = file_hash(file_path) if rehash else None
+        with self._lock:
+            entry = self.entries.get(track_key(track))
+            if entry is None:
+                return
+            entry['size'] = size
+            entry['sha1'] = sha1
+            self._unsaved += 1
+
+    def add_source(self, track, source):
+        """
+        Anota que una pista ya registrada pertenece también a una playlist o álbum
+
+        Args:
+            track (Track | str): Pista
+            source (str): Playlist o álbum de origen
+        """
+        if not source:
+            return
+        with self._lock:
+            entry = self.entries.get(track_key(track))
+            if entry is not None and source not in entry.setdefault('sources', []):
+                entry['sources'].append(source)
+                self._unsaved += 1
+
+    def remove_source(self, key, source):
+        """
+        Quita una playlist o álbum de los orígenes de una pista
+
+        Args:
+            key (str): Clave de la pista
+            source (str): Playlist o álbum de origen
+
+        Returns:
+            list: Orígenes que le quedan a la pista
+        """
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return []
+            sources = entry.get('sources', [])
+            if source in sources:
+                sources.remove(source)
+                self._unsaved += 1
+            return list(sources)
+
+    def remove(self, key):
+        """
+        Elimina una pista del manifiesto
+
+        Args:
+            key (str): Clave de la pista
+        """
+        with self._lock:
+            if self.entries.pop(key, None) is not None:
+                self._unsaved += 1
+
+def file_hash(file_path):
+    """
+    Calcula el hash SHA-1 de un archivo
+
+    Args:
+        file_path (str): Ruta del archivo
+
+    Returns:
+        str: Hash en hexadecimal
+    """
+    digest = hashlib.sha1()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+_manifests = {}
+_manifests_lock = threading.Lock()
+
+def get_manifest(folder):
+    """
+    Obtiene el manifiesto de una carpeta, compartido por todos los hilos
+
+    Args:
+        folder (str): Carpeta destino
+
+    Returns:
+        DownloadManifest: Manifiesto de la carpeta
+    """
+    folder = os.path.normpath(folder)
+    with _manifests_lock:
+        manifest = _manifests.get(folder)
+        if manifest is None:
+            manifest = DownloadManifest(folder)
+            _manifests[folder] = manifest
+        return manifest
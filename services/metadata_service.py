@@ -4,19 +4,63 @@
 Listify - Servicio de metadatos para archivos de audio
 """
 import os
+import base64
+import hashlib
 import requests
+import threading
+from collections import OrderedDict
 from io import BytesIO
 from PIL import Image
+from mutagen import File as MutagenFile
+from mutagen.flac import Picture
 from mutagen.id3 import ID3, APIC, TIT2, TPE1, TALB, TDRC, TRCK, TCON
 from mutagen.mp3 import MP3
+from mutagen.mp4 import MP4, MP4Cover
 from mutagen.id3._util import ID3NoHeaderError
+from config import CACHE_DIR, COVER_CACHE_ENABLED, COVER_CACHE_MEMORY_SIZE, ID3_PADDING
+from services.track import as_track
+
+# Extensiones de audio que la aplicación descarga, etiqueta y reproduce
+AUDIO_EXTENSIONS = ('.mp3', '.opus', '.ogg', '.m4a')
+VORBIS_EXTENSIONS = ('.opus', '.ogg')
+MP4_EXTENSIONS = ('.m4a', '.mp4')
+
+# Carpeta (dentro del destino) para los audios descargados pendientes de convertir
+STAGING_DIRNAME = '.listify_tmp'
+
+# Nombre de cada metadato en los comentarios Vorbis y en los átomos de MP4
+VORBIS_FIELDS = {
+    'title': 'title',
+    'artist': 'artist',
+    'album': 'album',
+    'year': 'date',
+    'track_number': 'tracknumber',
+    'genre': 'genre',
+}
+MP4_FIELDS = {
+    'title': '\xa9nam',
+    'artist': '\xa9ART',
+    'album': '\xa9alb',
+    'year': '\xa9day',
+    'genre': '\xa9gen',
+}
+
+# Almacén en disco de portadas procesadas: cada imagen se guarda una vez con el
+# hash de su contenido y un índice por URL apunta a ella
+COVERS_DIR = os.path.join(CACHE_DIR, 'covers')
+COVER_EXTENSIONS = {'image/jpeg': '.jpg', 'image/png': '.png'}
+
+# Portadas procesadas en memoria (LRU) y un lock por URL para descargar cada una una sola vez
+_cover_memory = OrderedDict()
+_cover_locks = {}
+_cover_lock = threading.Lock()
 
 def add_metadata_to_file(file_path, metadata):
     """
-    Añade metadatos a un archivo MP3
+    Añade metadatos a un archivo de audio (MP3, Ogg/Opus o M4A)
     
     Args:
-        file_path (str): Ruta al archivo MP3
+        file_path (str): Ruta al archivo de audio
         metadata (dict): Diccionario con los metadatos a añadir
             title: Título de la canción
             artist: Artista
@@ -39,97 +83,297 @@ def add_metadata_to_file(file_path, metadata):
         print(f"Añadiendo metadatos a {file_path}")
         print(f"Metadatos: {metadata}")
         
-        # Intenta abrir el archivo MP3 existente o crea uno nuevo
-        try:
-            audio = ID3(file_path)
-        except ID3NoHeaderError:
-            print(f"No se encontraron etiquetas ID3 en {file_path}, creando nuevas")
-            audio = ID3()
+        # Cada contenedor guarda las etiquetas a su manera
+        extension = os.path.splitext(file_path)[1].lower()
+        if extension in VORBIS_EXTENSIONS:
+            _add_vorbis_metadata(file_path, metadata)
+        elif extension in MP4_EXTENSIONS:
+            _add_mp4_metadata(file_path, metadata)
+        else:
+            _add_id3_metadata(file_path, metadata)
         
-        # Añadir título
-        if 'title' in metadata and metadata['title']:
-            audio['TIT2'] = TIT2(encoding=3, text=metadata['title'])
+        print(f"Metadatos guardados exitosamente en {file_path}")
+        return True
+    
+    except Exception as e:
+        print(f"Error al añadir metadatos: {e}")
+        return False
+
+def update_tags_in_place(file_path, metadata):
+    """
+    Vuelve a etiquetar un archivo ya descargado aprovechando su relleno
+    
+    Si las etiquetas nuevas caben en el hueco reservado al crear el archivo,
+    solo se reescribe la cabecera y el audio no se toca; si no caben, el
+    archivo se reescribe una vez reservando de nuevo ID3_PADDING bytes.
+    
+    Args:
+        file_path (str): Ruta al archivo de audio
+        metadata (dict): Metadatos a escribir (mismo formato que add_metadata_to_file)
+    
+    Returns:
+        bool: True si las etiquetas se escribieron sin reescribir el archivo completo
+    """
+    extension = os.path.splitext(file_path)[1].lower()
+    if extension in VORBIS_EXTENSIONS:
+        return _add_vorbis_metadata(file_path, metadata)
+    if extension in MP4_EXTENSIONS:
+        return _add_mp4_metadata(file_path, metadata)
+    return _add_id3_metadata(file_path, metadata)
+
+class _PaddingStrategy:
+    """
+    Estrategia de relleno para los save() de mutagen
+    
+    Reutiliza el relleno existente siempre que las etiquetas quepan, de modo
+    que mutagen escribe solo la cabecera; si no caben, reserva ID3_PADDING.
+    """
+    def __init__(self):
+        self.in_place = True
+    
+    def __call__(self, info):
+        if info.padding >= 0:
+            return info.padding
+        self.in_place = False
+        return ID3_PADDING
+
+def get_processed_cover(cover_url):
+    """
+    Obtiene una portada lista para incrustarla en un archivo de audio
+    
+    Todas las pistas de un álbum o playlist comparten la misma URL, así que
+    cada portada se descarga y procesa una sola vez: se busca primero en
+    memoria, luego en el almacén de disco y solo si falta se descarga.
+    
+    Args:
+        cover_url (str): URL de la portada
+    
+    Returns:
+        tuple: (datos de la imagen, tipo MIME) o None si no se pudo descargar
+    """
+    if not COVER_CACHE_ENABLED:
+        return _download_cover(cover_url)
+    
+    key = hashlib.sha1(cover_url.encode('utf-8')).hexdigest()
+    with _cover_lock:
+        cover = _cover_memory.get(key)
+        if cover is not None:
+            _cover_memory.move_to_end(key)
+            return cover
+        url_lock = _cover_locks.setdefault(key, threading.Lock())
+    
+    # Los hilos que piden la misma portada esperan a que el primero la obtenga
+    with url_lock:
+        with _cover_lock:
+            cover = _cover_memory.get(key)
+        if cover is not None:
+            return cover
         
-        # Añadir artista
-        if 'artist' in metadata and metadata['artist']:
-            audio['TPE1'] = TPE1(encoding=3, text=metadata['artist'])
+        cover = _read_cached_cover(key)
+        if cover is None:
+            cover = _download_cover(cover_url)
+            if cover is not None:
+                _write_cached_cover(key, cover)
         
-        # Añadir álbum
-        if 'album' in metadata and metadata['album']:
-            audio['TALB'] = TALB(encoding=3, text=metadata['album'])
+        with _cover_lock:
+            _cover_locks.pop(key, None)
+            if cover is not None:
+                _cover_memory[key] = cover
+                while len(_cover_memory) > COVER_CACHE_MEMORY_SIZE:
+                    _cover_memory.popitem(last=False)
+    return cover
+
+def _read_cached_cover(key):
+    """Lee una portada del almacén de disco a partir del hash de su URL"""
+    try:
+        with open(os.path.join(COVERS_DIR, 'urls', key), 'r', encoding='utf-8') as f:
+            filename, cover_type = f.read().split(' ', 1)
+        with open(os.path.join(COVERS_DIR, filename), 'rb') as f:
+            return f.read(), cover_type
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"Error al leer la portada en caché: {e}")
+        return None
+
+def _write_cached_cover(key, cover):
+    """Guarda una portada en el almacén de disco, con su contenido como nombre"""
+    cover_data, cover_type = cover
+    filename = hashlib.sha1(cover_data).hexdigest() + COVER_EXTENSIONS.get(cover_type, '.img')
+    
+    try:
+        os.makedirs(os.path.join(COVERS_DIR, 'urls'), exist_ok=True)
         
-        # Añadir año
-        if 'year' in metadata and metadata['year']:
-            audio['TDRC'] = TDRC(encoding=3, text=metadata['year'])
+        cover_path = os.path.join(COVERS_DIR, filename)
+        if not os.path.exists(cover_path):
+            _write_atomic(cover_path, cover_data)
+        _write_atomic(os.path.join(COVERS_DIR, 'urls', key), f"{filename} {cover_type}".encode('utf-8'))
+    except Exception as e:
+        print(f"Error al guardar la portada en caché: {e}")
+
+def _write_atomic(path, data):
+    """Escribe un archivo con un nombre temporal y lo mueve a su destino"""
+    temp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+def _download_cover(cover_url):
+    """
+    Descarga una portada y la reduce como máximo a 500x500 en JPEG
+    
+    Args:
+        cover_url (str): URL de la portada
+    
+    Returns:
+        tuple: (datos de la imagen, tipo MIME) o None si no se pudo descargar
+    """
+    try:
+        print(f"Intentando descargar portada desde: {cover_url}")
+        response = requests.get(cover_url)
+        if response.status_code != 200:
+            print(f"Error al descargar portada. Código de estado: {response.status_code}")
+            return None
+    except Exception as e:
+        print(f"Error al descargar portada: {e}")
+        return None
+    
+    cover_data = response.content
+    print(f"Portada descargada, tamaño: {len(cover_data)} bytes")
+    
+    # Procesar la imagen con PIL para asegurar compatibilidad
+    try:
+        img = Image.open(BytesIO(cover_data))
+        print(f"Imagen abierta: {img.format}, tamaño: {img.size}")
         
-        # Añadir número de pista
-        if 'track_number' in metadata and metadata['track_number']:
-            audio['TRCK'] = TRCK(encoding=3, text=metadata['track_number'])
+        # Redimensionar si es demasiado grande (max 500x500)
+        if img.width > 500 or img.height > 500:
+            img.thumbnail((500, 500), Image.LANCZOS)
+            print(f"Imagen redimensionada a: {img.size}")
         
-        # Añadir género
-        if 'genre' in metadata and metadata['genre']:
-            audio['TCON'] = TCON(encoding=3, text=metadata['genre'])
+        # Guardar en memoria
+        output = BytesIO()
+        img.convert('RGB').save(output, format='JPEG', quality=90)
+        cover_data = output.getvalue()
+        cover_type = 'image/jpeg'
+        print(f"Imagen convertida a JPEG, nuevo tamaño: {len(cover_data)} bytes")
+    except Exception as e:
+        print(f"Error al procesar imagen: {e}")
+        cover_type = response.headers.get('Content-Type', 'image/jpeg')
+    
+    return cover_data, cover_type
+
+def _add_id3_metadata(file_path, metadata):
+    """Escribe los metadatos como etiquetas ID3 en un MP3; devuelve True si no hubo que mover el audio"""
+    # Intenta abrir el archivo MP3 existente o crea uno nuevo
+    try:
+        audio = ID3(file_path)
+    except ID3NoHeaderError:
+        print(f"No se encontraron etiquetas ID3 en {file_path}, creando nuevas")
+        audio = ID3()
+    
+    # Añadir título
+    if 'title' in metadata and metadata['title']:
+        audio['TIT2'] = TIT2(encoding=3, text=metadata['title'])
+    
+    # Añadir artista
+    if 'artist' in metadata and metadata['artist']:
+        audio['TPE1'] = TPE1(encoding=3, text=metadata['artist'])
+    
+    # Añadir álbum
+    if 'album' in metadata and metadata['album']:
+        audio['TALB'] = TALB(encoding=3, text=metadata['album'])
+    
+    # Añadir año
+    if 'year' in metadata and metadata['year']:
+        audio['TDRC'] = TDRC(encoding=3, text=metadata['year'])
+    
+    # Añadir número de pista
+    if 'track_number' in metadata and metadata['track_number']:
+        audio['TRCK'] = TRCK(encoding=3, text=metadata['track_number'])
+    
+    # Añadir género
+    if 'genre' in metadata and metadata['genre']:
+        audio['TCON'] = TCON(encoding=3, text=metadata['genre'])
+    
+    # Añadir portada
+    cover = get_processed_cover(metadata['cover_url']) if metadata.get('cover_url') else None
+    if cover:
+        cover_data, cover_type = cover
         
-        # Añadir portada
-        if 'cover_url' in metadata and metadata['cover_url']:
-            try:
-                print(f"Intentando descargar portada desde: {metadata['cover_url']}")
-                response = requests.get(metadata['cover_url'])
-                if response.status_code != 200:
-                    print(f"Error al descargar portada. Código de estado: {response.status_code}")
-                    return False
-                    
-                cover_data = response.content
-                print(f"Portada descargada, tamaño: {len(cover_data)} bytes")
-                
-                # Procesar la imagen con PIL para asegurar compatibilidad
-                try:
-                    img = Image.open(BytesIO(cover_data))
-                    print(f"Imagen abierta: {img.format}, tamaño: {img.size}")
-                    
-                    # Redimensionar si es demasiado grande (max 500x500)
-                    if img.width > 500 or img.height > 500:
-                        img.thumbnail((500, 500), Image.LANCZOS)
-                        print(f"Imagen redimensionada a: {img.size}")
-                    
-                    # Guardar en memoria
-                    output = BytesIO()
-                    img.convert('RGB').save(output, format='JPEG', quality=90)
-                    cover_data = output.getvalue()
-                    cover_type = 'image/jpeg'
-                    print(f"Imagen convertida a JPEG, nuevo tamaño: {len(cover_data)} bytes")
-                except Exception as e:
-                    print(f"Error al procesar imagen: {e}")
-                    cover_type = response.headers.get('Content-Type', 'image/jpeg')
-                
-                # Eliminar portadas existentes
-                for key in list(audio.keys()):
-                    if key.startswith('APIC'):
-                        print(f"Eliminando portada existente: {key}")
-                        del audio[key]
-                
-                # Añadir nueva portada
-                audio['APIC'] = APIC(
-                    encoding=3,            # 3 es para codificación UTF-8
-                    mime=cover_type,       # El tipo MIME de la imagen
-                    type=3,                # 3 es para la portada del álbum (front cover)
-                    desc='Cover',          # Descripción
-                    data=cover_data        # Los datos binarios de la imagen
-                )
-                print("Portada añadida exitosamente")
-            except Exception as e:
-                print(f"Error al agregar portada: {e}")
-        else:
-            print("No se proporcionó URL de portada")
+        # Eliminar portadas existentes
+        for key in list(audio.keys()):
+            if key.startswith('APIC'):
+                print(f"Eliminando portada existente: {key}")
+                del audio[key]
         
-        # Guardar cambios
-        audio.save(file_path, v2_version=3)  # Forzar ID3v2.3 para mayor compatibilidad
-        print(f"Metadatos guardados exitosamente en {file_path}")
-        return True
+        # Añadir nueva portada
+        audio['APIC'] = APIC(
+            encoding=3,            # 3 es para codificación UTF-8
+            mime=cover_type,       # El tipo MIME de la imagen
+            type=3,                # 3 es para la portada del álbum (front cover)
+            desc='Cover',          # Descripción
+            data=cover_data        # Los datos binarios de la imagen
+        )
+        print("Portada añadida exitosamente")
+    elif not metadata.get('cover_url'):
+        print("No se proporcionó URL de portada")
     
-    except Exception as e:
-        print(f"Error al añadir metadatos: {e}")
-        return False
+    # Guardar cambios
+    padding = _PaddingStrategy()
+    audio.save(file_path, v2_version=3, padding=padding)  # Forzar ID3v2.3 para mayor compatibilidad
+    return padding.in_place
+
+def _add_vorbis_metadata(file_path, metadata):
+    """Escribe los metadatos como comentarios Vorbis en un Ogg/Opus; devuelve True si no hubo que mover el audio"""
+    audio = MutagenFile(file_path)
+    if audio is None:
+        raise ValueError(f"Formato de audio no reconocido: {file_path}")
+    if audio.tags is None:
+        audio.add_tags()
+    
+    for key, field in VORBIS_FIELDS.items():
+        if metadata.get(key):
+            audio[field] = [str(metadata[key])]
+    
+    # La portada va en un bloque METADATA_BLOCK_PICTURE codificado en base64
+    cover = get_processed_cover(metadata['cover_url']) if metadata.get('cover_url') else None
+    if cover:
+        picture = Picture()
+        picture.type = 3
+        picture.mime = cover[1]
+        picture.desc = 'Cover'
+        picture.data = cover[0]
+        audio['metadata_block_picture'] = [base64.b64encode(picture.write()).decode('ascii')]
+    
+    padding = _PaddingStrategy()
+    audio.save(padding=padding)
+    return padding.in_place
+
+def _add_mp4_metadata(file_path, metadata):
+    """Escribe los metadatos como átomos de iTunes en un M4A; devuelve True si no hubo que mover el audio"""
+    audio = MP4(file_path)
+    if audio.tags is None:
+        audio.add_tags()
+    
+    for key, field in MP4_FIELDS.items():
+        if metadata.get(key):
+            audio[field] = [str(metadata[key])]
+    
+    if metadata.get('track_number'):
+        try:
+            audio['trkn'] = [(int(metadata['track_number']), 0)]
+        except ValueError:
+            pass
+    
+    cover = get_processed_cover(metadata['cover_url']) if metadata.get('cover_url') else None
+    if cover:
+        image_format = MP4Cover.FORMAT_PNG if cover[1] == 'image/png' else MP4Cover.FORMAT_JPEG
+        audio['covr'] = [MP4Cover(cover[0], imageformat=image_format)]
+    
+    padding = _PaddingStrategy()
+    audio.save(padding=padding)
+    return padding.in_place
 
 def fix_mp3_file(file_path):
     """
@@ -146,8 +390,9 @@ def fix_mp3_file(file_path):
         try:
             mp3 = MP3(file_path)
             if not mp3.tags:
+                # Reservar relleno para que las etiquetas y la portada se escriban después sin mover el audio
                 mp3.add_tags()
-                mp3.save()
+                mp3.save(padding=lambda info: ID3_PADDING)
             return True
         except Exception:
             return False
@@ -155,6 +400,40 @@ def fix_mp3_file(file_path):
     except Exception:
         return False
 
+def is_valid_audio_file(file_path):
+    """
+    Comprueba que un archivo de audio exista y se pueda leer
+    
+    Args:
+        file_path (str): Ruta al archivo de audio (MP3, Ogg/Opus o M4A)
+    
+    Returns:
+        bool: True si el archivo tiene un tamaño razonable y una duración válida
+    """
+    try:
+        if os.path.getsize(file_path) < 0.1 * 1024 * 1024:
+            return False
+        audio = MutagenFile(file_path)
+        return audio is not None and audio.info.length > 0
+    except Exception:
+        return False
+
+def get_audio_length(file_path):
+    """
+    Obtiene la duración de un archivo de audio
+    
+    Args:
+        file_path (str): Ruta al archivo de audio
+    
+    Returns:
+        float: Duración en segundos, o 0 si no se puede leer
+    """
+    try:
+        audio = MutagenFile(file_path)
+        return audio.info.length if audio is not None else 0
+    except Exception:
+        return 0
+
 def extract_metadata_from_spotify_track(track_info):
     """
     Extrae metadatos de un objeto de pista de Spotify
@@ -207,26 +486,33 @@ def parse_track_name(track_name):
     
     return title, artist
 
-def get_basic_metadata(track_name, cover_url=None, album_name=None):
+def get_basic_metadata(track, cover_url=None, album_name=None):
     """
-    Obtiene metadatos básicos a partir del nombre de la pista
+    Obtiene metadatos básicos de una pista
     
     Args:
-        track_name (str): Nombre de la pista en formato "título - artista"
-        cover_url (str, optional): URL de la portada
-        album_name (str, optional): Nombre del álbum
+        track (Track | str): Pista o nombre en formato "título - artista"
+        cover_url (str, optional): URL de la portada si la pista no trae la suya
+        album_name (str, optional): Nombre del álbum si la pista no trae el suyo
     
     Returns:
         dict: Diccionario con los metadatos básicos
     """
-    title, artist = parse_track_name(track_name)
+    track = as_track(track)
     
     metadata = {
-        'title': title,
-        'artist': artist,
-        'album': album_name if album_name else ""
+        'title': track.title,
+        'artist': track.artist,
+        'album': track.album or album_name or ""
     }
     
+    if track.year:
+        metadata['year'] = track.year
+    
+    if track.track_number:
+        metadata['track_number'] = str(track.track_number)
+    
+    cover_url = track.cover_url or cover_url
     if cover_url:
         metadata['cover_url'] = cover_url
     
@@ -4,13 +4,24 @@
 Listify - Servicio de reproductor de música
 """
 import os
+import base64
 import pygame
+import subprocess
+import tempfile
 import threading
 import time
+from mutagen import File as MutagenFile
+from mutagen.flac import Picture
 from mutagen.id3 import ID3
-from mutagen.mp3 import MP3
+from mutagen.mp4 import MP4
 from PIL import Image, ImageTk
 from io import BytesIO
+from config import FFMPEG_PATH
+from services.metadata_service import (AUDIO_EXTENSIONS, VORBIS_EXTENSIONS, MP4_EXTENSIONS,
+                                       VORBIS_FIELDS, MP4_FIELDS, STAGING_DIRNAME)
+
+# Formatos que pygame reproduce directamente; el resto se decodifica antes con ffmpeg
+PYGAME_EXTENSIONS = ('.mp3', '.ogg', '.opus')
 
 class MusicPlayerService:
     """Clase para gestionar la reproducción de música"""
@@ -33,6 +44,13 @@ class MusicPlayerService:
         # Lista de canciones
         self.playlist = []
         self.current_index = -1
+        
+        # Copia decodificada de la canción actual cuando pygame no soporta su formato
+        self._decoded_file = None
+        
+        # Identificador de la última petición de reproducción (descarta decodificaciones viejas)
+        self._play_request = 0
+        self._play_lock = threading.Lock()
     
     def set_volume(self, volume):
         """
@@ -46,20 +64,22 @@ class MusicPlayerService:
     
     def scan_directory(self, directory):
         """
-        Escanea un directorio en busca de archivos MP3
+        Escanea un directorio en busca de archivos de audio (MP3, Ogg/Opus y M4A)
         
         Args:
             directory (str): Ruta del directorio a escanear
         
         Returns:
-            list: Lista de rutas a archivos MP3
+            list: Lista de rutas a archivos de audio
         """
         mp3_files = []
         
         try:
-            for root, _, files in os.walk(directory):
+            for root, dirs, files in os.walk(directory):
+                # La carpeta temporal de descargas solo tiene audios sin procesar o a medias
+                dirs[:] = [d for d in dirs if d != STAGING_DIRNAME]
                 for file in files:
-                    if file.lower().endswith('.mp3'):
+                    if file.lower().endswith(AUDIO_EXTENSIONS) and '.tmp.' not in file.lower():
                         full_path = os.path.join(root, file)
                         mp3_files.append(full_path)
         except Exception as e:
@@ -109,22 +129,21 @@ class MusicPlayerService:
             # Detener la reproducción actual
             self.stop()
             
-            # Cargar y reproducir la nueva canción
-            pygame.mixer.music.load(song_path)
-            pygame.mixer.music.set_volume(self.volume)
-            pygame.mixer.music.play()
-            
-            # Actualizar estado
-            self.current_song = song_path
-            self.paused = False
-            self.stopped = False
-            
             # Obtener duración
-            audio = MP3(song_path)
-            self.song_length = audio.info.length
+            audio = MutagenFile(song_path)
+            self.song_length = audio.info.length if audio is not None else 0
             
-            # Iniciar hilo de actualización
-            self.start_update_thread()
+            with self._play_lock:
+                self._play_request += 1
+                request_id = self._play_request
+                
+                # Actualizar estado
+                self.current_song = song_path
+                self.paused = False
+                self.stopped = False
+                
+                # Cargar y reproducir la nueva canción
+                self._start_playback(song_path, request_id)
             
             # Obtener metadatos
             return self.get_song_metadata(song_path)
@@ -133,6 +152,96 @@ class MusicPlayerService:
             print(f"Error al reproducir canción: {e}")
             return None
     
+    def _start_playback(self, song_path, request_id):
+        """
+        Carga y reproduce una canción; si pygame no soporta su formato se decodifica en segundo plano
+        
+        Args:
+            song_path (str): Ruta del archivo de audio
+            request_id (int): Petición de reproducción a la que corresponde
+        """
+        if song_path.lower().endswith(PYGAME_EXTENSIONS):
+            try:
+                pygame.mixer.music.load(song_path)
+                self._begin_playback(None)
+                return
+            except pygame.error as e:
+                print(f"pygame no puede abrir {song_path}, se decodifica con ffmpeg: {e}")
+        
+        # Decodificar puede tardar varios segundos: se hace fuera del hilo de la interfaz
+        threading.Thread(target=self._decode_and_play, args=(song_path, request_id), daemon=True).start()
+    
+    def _decode_and_play(self, song_path, request_id):
+        """Decodifica una canción con ffmpeg y la reproduce si sigue siendo la pedida"""
+        try:
+            decoded_file = self._decode_for_pygame(song_path)
+        except Exception as e:
+            print(f"Error al decodificar {song_path}: {e}")
+            return
+        
+        with self._play_lock:
+            # Mientras se decodificaba se pidió otra canción o se detuvo la reproducción
+            if request_id != self._play_request or self.stopped:
+                self._remove_decoded(decoded_file)
+                return
+            
+            try:
+                pygame.mixer.music.load(decoded_file)
+            except pygame.error as e:
+                print(f"Error al reproducir canción: {e}")
+                self._remove_decoded(decoded_file)
+                return
+            self._begin_playback(decoded_file)
+    
+    def _begin_playback(self, decoded_file):
+        """
+        Reproduce la canción que se acaba de cargar en pygame
+        
+        Args:
+            decoded_file (str): Copia decodificada cargada, o None si se cargó el original
+        """
+        # pygame ya soltó la copia anterior al cargar la nueva canción
+        previous_decoded = self._decoded_file
+        self._decoded_file = decoded_file
+        self._remove_decoded(previous_decoded)
+        
+        pygame.mixer.music.set_volume(self.volume)
+        pygame.mixer.music.play()
+        if self.paused:
+            pygame.mixer.music.pause()
+        
+        # Iniciar hilo de actualización
+        self.start_update_thread()
+    
+    def _decode_for_pygame(self, song_path):
+        """
+        Decodifica un archivo de audio a un Ogg Vorbis temporal que pygame reproduce
+        
+        Args:
+            song_path (str): Ruta del archivo de audio
+        
+        Returns:
+            str: Ruta del archivo temporal
+        """
+        fd, decoded_path = tempfile.mkstemp(prefix='listify_', suffix='.ogg')
+        os.close(fd)
+        
+        command = [FFMPEG_PATH, '-y', '-loglevel', 'error', '-i', song_path,
+                   '-vn', '-codec:a', 'libvorbis', '-q:a', '5', decoded_path]
+        result = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        if result.returncode != 0:
+            self._remove_decoded(decoded_path)
+            raise RuntimeError(result.stderr.decode(errors='ignore').strip() or "ffmpeg falló")
+        return decoded_path
+    
+    def _remove_decoded(self, decoded_path):
+        """Elimina una copia decodificada que ya no se usa"""
+        if decoded_path and os.path.exists(decoded_path):
+            try:
+                os.remove(decoded_path)
+            except OSError as e:
+                print(f"No se pudo eliminar {decoded_path}: {e}")
+    
     def pause(self):
         """Pausa la reproducción actual"""
         if not self.stopped and not self.paused:
@@ -188,7 +297,7 @@ class MusicPlayerService:
         Obtiene los metadatos de una canción
         
         Args:
-            song_path (str): Ruta del archivo MP3
+            song_path (str): Ruta del archivo de audio
         
         Returns:
             dict: Metadatos de la canción
@@ -202,6 +311,14 @@ class MusicPlayerService:
         }
         
         try:
+            extension = os.path.splitext(song_path)[1].lower()
+            if extension in VORBIS_EXTENSIONS:
+                self._read_vorbis_metadata(song_path, metadata)
+                return metadata
+            if extension in MP4_EXTENSIONS:
+                self._read_mp4_metadata(song_path, metadata)
+                return metadata
+            
             audio = ID3(song_path)
             
             # Obtener título
@@ -227,6 +344,32 @@ class MusicPlayerService:
         
         return metadata
     
+    def _read_vorbis_metadata(self, song_path, metadata):
+        """Lee título, artista, álbum y portada de los comentarios Vorbis de un Ogg/Opus"""
+        audio = MutagenFile(song_path)
+        tags = audio.tags if audio is not None and audio.tags is not None else {}
+        
+        for key in ('title', 'artist', 'album'):
+            values = tags.get(VORBIS_FIELDS[key])
+            if values:
+                metadata[key] = values[0]
+        
+        pictures = tags.get('metadata_block_picture')
+        if pictures:
+            metadata['cover'] = Picture(base64.b64decode(pictures[0])).data
+    
+    def _read_mp4_metadata(self, song_path, metadata):
+        """Lee título, artista, álbum y portada de los átomos de un M4A"""
+        tags = MP4(song_path).tags or {}
+        
+        for key in ('title', 'artist', 'album'):
+            values = tags.get(MP4_FIELDS[key])
+            if values:
+                metadata[key] = values[0]
+        
+        if tags.get('covr'):
+            metadata['cover'] = bytes(tags['covr'][0])
+    
     def seek(self, position):
         """
         Busca una posición específica en la canción
@@ -316,4 +459,5 @@ class MusicPlayerService:
     def cleanup(self):
         """Limpia los recursos cuando se cierra la app"""
         self.stop()
-        pygame.mixer.quit()
\ No newline at end of file
+        pygame.mixer.quit()
+        self._remove_decoded(self._decoded_file)
\ No newline at end of file
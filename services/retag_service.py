@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Listify - Reetiquetado de las pistas ya descargadas en una carpeta
+"""
+import os
+from tkinter import messagebox
+from services.manifest_service import get_manifest
+from services.metadata_service import get_basic_metadata, update_tags_in_place
+from services.spotify_service import resolve_tracks
+from services.track import Track
+
+def _tracks_from_manifest(manifest):
+    """
+    Reconstruye las pistas registradas en el manifiesto de una carpeta
+
+    Las registradas con ID de Spotify se piden a Spotify para tener sus
+    metadatos actuales; el resto se reconstruye a partir del título guardado.
+
+    Args:
+        manifest (DownloadManifest): Manifiesto de la carpeta
+
+    Returns:
+        list: Pistas (Track), cada una con la misma clave que tiene en el manifiesto
+    """
+    entries = dict(manifest.entries)
+    spotify_ids = [key.split(':', 1)[1] for key in entries if key.startswith('spotify:')]
+    resolved = resolve_tracks(spotify_ids) if spotify_ids else {}
+
+    tracks = []
+    for key, entry in entries.items():
+        kind, value = key.split(':', 1)
+        if kind == 'spotify' and value in resolved:
+            tracks.append(resolved[value])
+            continue
+
+        track = Track.from_display(entry.get('title', ''))
+        if kind == 'spotify':
+            track.id = value
+        elif kind == 'isrc':
+            track.isrc = value
+        tracks.append(track)
+    return tracks
+
+def retag_folder(destino, root, shared_vars):
+    """
+    Vuelve a escribir los metadatos de todas las pistas descargadas en una carpeta
+
+    Las etiquetas se escriben en el relleno reservado al crear cada archivo,
+    así que normalmente solo se reescribe la cabecera. Después se actualiza
+    el manifiesto, para que la próxima sincronización no tome por nuevas las
+    pistas cuyo tamaño haya cambiado; el manifiesto se escribe una sola vez,
+    al final. Los archivos que no figuran en el manifiesto no se tocan.
+
+    Args:
+        destino (str): Carpeta con las pistas descargadas
+        root (tk.Tk): Objeto raíz de tkinter
+        shared_vars (dict): Variables compartidas
+    """
+    root.after(0, lambda: shared_vars['current_task'].set("Reetiquetando..."))
+    root.after(0, lambda: shared_vars['status_text'].set("Leyendo el manifiesto de la carpeta..."))
+
+    manifest = get_manifest(destino)
+    try:
+        tracks = _tracks_from_manifest(manifest)
+    except Exception as e:
+        root.after(0, lambda err=str(e): messagebox.showerror("Error", f"No se pudieron obtener las pistas: {err}"))
+        root.after(0, lambda: shared_vars['current_task'].set(""))
+        return
+
+    total = len(tracks)
+    in_place = rewritten = failed = 0
+
+    for i, track in enumerate(tracks, 1):
+        file_path = manifest.get_file(track)
+        if not file_path:
+            failed += 1
+            continue
+
+        root.after(0, lambda n=os.path.basename(file_path): shared_vars['status_text'].set(f"Reetiquetando: {n}"))
+        try:
+            if update_tags_in_place(file_path, get_basic_metadata(track)):
+                # Solo cambió la cabecera: no se vuelve a leer el audio para calcular el hash
+                in_place += 1
+                manifest.update_file(track, file_path)
+            else:
+                rewritten += 1
+                manifest.update_file(track, file_path, rehash=True)
+        except Exception as e:
+            print(f"Error al reetiquetar {file_path}: {e}")
+            failed += 1
+
+        root.after(0, lambda c=i, t=total: shared_vars['current_task'].set(f"Reetiquetando ({c}/{t})"))
+        root.after(0, lambda c=i, t=total: shared_vars['progress_var'].set((c / t) * 100))
+
+    manifest.save()
+
+    summary = f"{in_place} sin reescribir el audio, {rewritten} reescritas, {failed} con error"
+    root.after(0, lambda: shared_vars['current_task'].set("Reetiquetado finalizado"))
+    root.after(0, lambda: shared_vars['status_text'].set(f"Reetiquetado: {summary}"))
+    root.after(0, lambda: shared_vars['progress_var'].set(100))
+    root.after(0, lambda: messagebox.showinfo("Reetiquetado completado", f"{total} pistas\n{summary}"))
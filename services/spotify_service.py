@@ -4,10 +4,24 @@
 Listify - Servicio de Spotify
 """
 import re
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import requests
 import spotipy
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from spotipy.cache_handler import MemoryCacheHandler
+from spotipy.exceptions import SpotifyException
 from spotipy.oauth2 import SpotifyClientCredentials
 from tkinter import messagebox
-from config import CLIENT_ID, CLIENT_SECRET
+from config import (CLIENT_ID, CLIENT_SECRET, SPOTIFY_MAX_WORKERS,
+                    SPOTIFY_CACHE_ENABLED, SPOTIFY_SEARCH_CACHE_TTL,
+                    SPOTIFY_RATE_LIMIT, SPOTIFY_MAX_RETRIES,
+                    SPOTIFY_LEAN_FETCH, SPOTIFY_MARKET)
+from services.cache_service import get_spotify_cache
+from services.track import Track, as_track
 import os
 
 env_path = os.path.join(os.getcwd(), '.env')
@@ -23,18 +37,434 @@ CLIENT_SECRET = os.getenv("CLIENT_SECRET")
 print(f"CLIENT_ID encontrado: {'Sí' if CLIENT_ID else 'No'}")
 print(f"CLIENT_SECRET encontrado: {'Sí' if CLIENT_SECRET else 'No'}")
 
+# Cliente compartido por todo el proceso
+_spotify_client = None
+_spotify_client_lock = threading.Lock()
+
+# Hilos de la pantalla principal (importación, búsqueda y detalles) más los de descarga de páginas
+_POOL_SIZE = SPOTIFY_MAX_WORKERS + 4
+
+class _SharedClientCredentials(SpotifyClientCredentials):
+    """Credenciales que reutilizan el token hasta que caduca, seguras entre hilos"""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._token_lock = threading.Lock()
+    
+    def get_access_token(self, *args, **kwargs):
+        # Evita que varios hilos pidan un token nuevo a la vez cuando el actual caduca
+        with self._token_lock:
+            return super().get_access_token(*args, **kwargs)
+
+class RequestScheduler:
+    """
+    Planificador de peticiones a Spotify compartido por todos los hilos
+    
+    Reparte un presupuesto común con un token bucket, respeta el Retry-After
+    de las respuestas 429 (pausando a todos los hilos) y reintenta los errores
+    transitorios con backoff exponencial con jitter.
+    """
+    RETRY_STATUSES = (429, 500, 502, 503, 504)
+    
+    def __init__(self, rate, burst, max_retries, backoff_base=0.5, backoff_max=30.0):
+        self.rate = rate
+        self.burst = burst
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        
+        self._lock = threading.Lock()
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        
+        # Contadores
+        self.requests = 0
+        self.retries = 0
+        self.wait_time = 0.0
+    
+    def _acquire(self):
+        """Espera hasta que haya presupuesto para una petición"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                
+                wait = self._blocked_until - now
+                if wait <= 0:
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        self.requests += 1
+                        return
+                    wait = (1 - self._tokens) / self.rate
+                self.wait_time += wait
+            time.sleep(wait)
+    
+    def _backoff(self, attempt, retry_after=None):
+        """
+        Calcula la espera antes de reintentar y la aplica a todos los hilos si la pide el servidor
+        
+        Args:
+            attempt (int): Número de reintento (desde 0)
+            retry_after (float, optional): Segundos indicados en la cabecera Retry-After
+        
+        Returns:
+            float: Segundos que debe esperar este hilo
+        """
+        if retry_after is not None:
+            delay = retry_after + random.uniform(0, 0.5)
+            with self._lock:
+                self._blocked_until = max(self._blocked_until, time.monotonic() + delay)
+        else:
+            delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+            delay = random.uniform(delay / 2, delay)
+        
+        with self._lock:
+            self.retries += 1
+            self.wait_time += delay
+        return delay
+    
+    def call(self, func, *args, **kwargs):
+        """
+        Ejecuta una petición respetando el límite y reintentando si procede
+        
+        Args:
+            func (callable): Función que realiza la petición
+        
+        Returns:
+            Resultado de la petición
+        
+        Raises:
+            SpotifyException: Si la petición falla o se agotan los reintentos
+        """
+        attempt = 0
+        while True:
+            self._acquire()
+            try:
+                return func(*args, **kwargs)
+            except SpotifyException as e:
+                if e.http_status not in self.RETRY_STATUSES or attempt >= self.max_retries:
+                    raise
+                retry_after = None
+                if e.http_status == 429:
+                    try:
+                        retry_after = float((e.headers or {}).get('Retry-After', 1))
+                    except (TypeError, ValueError):
+                        retry_after = 1.0
+                delay = self._backoff(attempt, retry_after)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                if attempt >= self.max_retries:
+                    raise
+                delay = self._backoff(attempt)
+            
+            attempt += 1
+            time.sleep(delay)
+    
+    def stats(self):
+        """
+        Obtiene los contadores del planificador
+        
+        Returns:
+            dict: Peticiones, reintentos y segundos de espera acumulados
+        """
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'retries': self.retries,
+                'wait_time': round(self.wait_time, 3)
+            }
+
+_scheduler = RequestScheduler(
+    rate=SPOTIFY_RATE_LIMIT,
+    burst=max(SPOTIFY_MAX_WORKERS, int(SPOTIFY_RATE_LIMIT)),
+    max_retries=SPOTIFY_MAX_RETRIES
+)
+
+def get_request_stats():
+    """
+    Obtiene los contadores de peticiones a Spotify
+    
+    Returns:
+        dict: Peticiones, reintentos y segundos de espera acumulados
+    """
+    return _scheduler.stats()
+
+class _ScheduledSpotify(spotipy.Spotify):
+    """Cliente de Spotify cuyas peticiones pasan todas por el planificador"""
+    def _internal_call(self, *args, **kwargs):
+        return _scheduler.call(super()._internal_call, *args, **kwargs)
+
+def _build_session():
+    """
+    Crea una sesión HTTP con un pool de conexiones persistentes
+    
+    Returns:
+        requests.Session: Sesión configurada
+    """
+    session = requests.Session()
+    # Solo se reintentan aquí los fallos de conexión; los códigos 429/5xx los gestiona el planificador
+    retry = Retry(total=2, connect=2, read=False, status=0, backoff_factor=0.3)
+    adapter = HTTPAdapter(pool_connections=2, pool_maxsize=_POOL_SIZE, max_retries=retry)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
 def get_spotify_client():
     """
-    Obtiene un cliente de Spotify API
+    Obtiene el cliente de Spotify API compartido por el proceso
+    
+    El token de acceso se guarda en memoria y solo se renueva al caducar;
+    todas las peticiones reutilizan el mismo pool de conexiones HTTP.
     
     Returns:
         spotipy.Spotify: Cliente de Spotify
     """
-    client_credentials_manager = SpotifyClientCredentials(
-        client_id=CLIENT_ID, 
-        client_secret=CLIENT_SECRET
+    global _spotify_client
+    
+    if _spotify_client is None:
+        with _spotify_client_lock:
+            if _spotify_client is None:
+                session = _build_session()
+                client_credentials_manager = _SharedClientCredentials(
+                    client_id=CLIENT_ID, 
+                    client_secret=CLIENT_SECRET,
+                    cache_handler=MemoryCacheHandler(),
+                    requests_session=session
+                )
+                _spotify_client = _ScheduledSpotify(
+                    client_credentials_manager=client_credentials_manager,
+                    requests_session=session
+                )
+    return _spotify_client
+
+# Límites de la API de Spotify
+ALBUMS_PER_REQUEST = 20
+ALBUM_TRACKS_PAGE_SIZE = 50
+PLAYLIST_PAGE_SIZE = 100
+TRACKS_PER_REQUEST = 50
+
+# Campos de la playlist que usa la importación (proyección del modo ligero)
+PLAYLIST_INFO_FIELDS = 'name,images,snapshot_id'
+PLAYLIST_ITEMS_FIELDS = (
+    'total,items(track(id,name,type,duration_ms,popularity,track_number,'
+    'external_ids(isrc),artists(name),album(id,name,release_date,images)))'
+)
+
+# Pistas ya conocidas por su ID de Spotify (importaciones y búsquedas)
+_track_store = {}
+_track_store_lock = threading.Lock()
+
+def _fetch_concurrently(func, args_list):
+    """
+    Ejecuta varias peticiones en paralelo conservando el orden de los argumentos
+    
+    Args:
+        func (callable): Función que realiza una petición
+        args_list (list): Lista de tuplas de argumentos
+    
+    Returns:
+        list: Resultados en el mismo orden que args_list
+    """
+    if not args_list:
+        return []
+    if len(args_list) == 1:
+        return [func(*args_list[0])]
+    
+    workers = min(SPOTIFY_MAX_WORKERS, len(args_list))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(lambda args: func(*args), args_list))
+
+def _expand_albums(sp, album_ids):
+    """
+    Obtiene los álbumes con todas sus pistas usando el endpoint de varios álbumes
+    
+    Cada petición devuelve hasta 20 álbumes con su primera página de pistas;
+    las páginas restantes se piden en paralelo.
+    
+    Args:
+        sp (spotipy.Spotify): Cliente de Spotify
+        album_ids (list): IDs de los álbumes
+    
+    Returns:
+        list: Álbumes completos, en el mismo orden que album_ids
+    """
+    chunks = [(album_ids[i:i + ALBUMS_PER_REQUEST],) for i in range(0, len(album_ids), ALBUMS_PER_REQUEST)]
+    albums = []
+    for response in _fetch_concurrently(lambda ids: sp.albums(ids), chunks):
+        albums.extend(album for album in response['albums'] if album)
+    
+    # Calcular las páginas de pistas que faltan en cada álbum
+    pending = []
+    for album in albums:
+        page = album['tracks']
+        for offset in range(len(page['items']), page['total'], ALBUM_TRACKS_PAGE_SIZE):
+            pending.append((album, offset))
+    
+    pages = _fetch_concurrently(
+        lambda album, offset: sp.album_tracks(album['id'], limit=ALBUM_TRACKS_PAGE_SIZE, offset=offset),
+        pending
     )
-    return spotipy.Spotify(client_credentials_manager=client_credentials_manager)
+    for (album, _), page in zip(pending, pages):
+        album['tracks']['items'].extend(page['items'])
+    
+    return albums
+
+def _iter_pages(first_page, fetch_page, page_size):
+    """
+    Genera los elementos de un recurso paginado página a página
+    
+    La primera página se entrega de inmediato; su total permite calcular los
+    offsets del resto, que se piden en paralelo con un pool limitado de hilos
+    y se entregan en orden conforme van llegando.
+    
+    Args:
+        first_page (dict): Primera página ya obtenida
+        fetch_page (callable): Función que recibe un offset y devuelve la página
+        page_size (int): Tamaño de página
+    
+    Yields:
+        list: Elementos de cada página, en el orden original
+    """
+    yield first_page['items']
+    
+    offsets = list(range(len(first_page['items']), first_page['total'], page_size))
+    if not offsets:
+        return
+    
+    executor = ThreadPoolExecutor(max_workers=min(SPOTIFY_MAX_WORKERS, len(offsets)))
+    futures = [executor.submit(fetch_page, offset) for offset in offsets]
+    try:
+        for future in futures:
+            yield future.result()['items']
+    finally:
+        # Si el consumidor se detiene antes de tiempo, no seguir pidiendo páginas
+        for future in futures:
+            future.cancel()
+        executor.shutdown(wait=False)
+
+def _playlist_page_kwargs(lean):
+    """
+    Parámetros de las peticiones de páginas de una playlist
+    
+    En modo ligero se piden solo los campos que usa la importación y se fija
+    un mercado, lo que elimina las listas available_markets de cada pista y álbum.
+    
+    Args:
+        lean (bool): Si se usa el modo ligero
+    
+    Returns:
+        dict: Argumentos para sp.playlist_tracks
+    """
+    if not lean:
+        return {}
+    return {'fields': PLAYLIST_ITEMS_FIELDS, 'market': SPOTIFY_MARKET}
+
+def _parse_spotify_url(url):
+    """
+    Identifica el tipo de recurso y su ID a partir de una URL de Spotify
+    
+    Args:
+        url (str): URL de Spotify
+    
+    Returns:
+        tuple: (tipo, id) donde tipo es 'album' o 'playlist', o (None, None) si no es válida
+    """
+    for kind in ('album', 'playlist'):
+        match = re.search(rf'{kind}/([a-zA-Z0-9]+)', url)
+        if match:
+            return kind, match.group(1)
+    return None, None
+
+def get_source_key(url):
+    """
+    Obtiene una clave estable para la playlist o álbum de una URL de Spotify
+    
+    Args:
+        url (str): URL de Spotify
+    
+    Returns:
+        str: "playlist:<id>" o "album:<id>", o None si la URL no es válida
+    """
+    kind, resource_id = _parse_spotify_url(url)
+    return f"{kind}:{resource_id}" if kind else None
+
+def _get_cache():
+    """
+    Obtiene la caché de respuestas si está habilitada
+    
+    Returns:
+        ResponseCache: Caché de respuestas o None si está deshabilitada o no disponible
+    """
+    if not SPOTIFY_CACHE_ENABLED:
+        return None
+    try:
+        return get_spotify_cache()
+    except Exception as e:
+        print(f"Caché de Spotify no disponible: {e}")
+        return None
+
+def remember_tracks(entries):
+    """
+    Guarda en memoria las pistas con ID para consultar sus detalles sin red
+    
+    Args:
+        entries (list): Pistas (Track) o textos; los textos se ignoran
+    """
+    with _track_store_lock:
+        for entry in entries:
+            if isinstance(entry, Track) and entry.id:
+                _track_store[entry.id] = entry
+
+def resolve_tracks(track_ids):
+    """
+    Obtiene las pistas indicadas, pidiendo a Spotify solo las que no están en memoria
+    
+    Las que faltan se resuelven con el endpoint de varias pistas (50 por petición).
+    
+    Args:
+        track_ids (list): IDs de Spotify
+    
+    Returns:
+        dict: Pistas (Track) por ID; las que no existen no aparecen
+    """
+    with _track_store_lock:
+        found = {track_id: _track_store[track_id] for track_id in track_ids if track_id in _track_store}
+    
+    missing = list(dict.fromkeys(track_id for track_id in track_ids if track_id not in found))
+    if missing:
+        sp = get_spotify_client()
+        chunks = [(missing[i:i + TRACKS_PER_REQUEST],) for i in range(0, len(missing), TRACKS_PER_REQUEST)]
+        resolved = []
+        for response in _fetch_concurrently(lambda ids: sp.tracks(ids), chunks):
+            resolved.extend(Track.from_spotify(item) for item in response['tracks'] if item)
+        remember_tracks(resolved)
+        found.update((track.id, track) for track in resolved)
+    
+    return found
+
+def _dump_entries(entries):
+    """
+    Prepara una lista de pistas y textos para guardarla en la caché
+    
+    Args:
+        entries (list): Pistas (Track) o textos
+    
+    Returns:
+        list: Lista serializable a JSON
+    """
+    return [entry.to_dict() if isinstance(entry, Track) else entry for entry in entries]
+
+def _load_entries(data):
+    """
+    Reconstruye una lista guardada con _dump_entries
+    
+    Args:
+        data (list): Lista leída de la caché
+    
+    Returns:
+        list: Pistas (Track) o textos
+    """
+    return [Track.from_dict(entry) if isinstance(entry, dict) else entry for entry in data]
 
 def search_spotify(query, search_type):
     """
@@ -47,6 +477,15 @@ def search_spotify(query, search_type):
     Returns:
         tuple: (resultados, url_portada, título)
     """
+    cache = _get_cache()
+    cache_key = f"search:{search_type}:{query.strip().lower()}"
+    if cache:
+        cached, _ = cache.get(cache_key, max_age=SPOTIFY_SEARCH_CACHE_TTL)
+        if cached:
+            results = _load_entries(cached['results'])
+            remember_tracks(results)
+            return results, cached['cover_url'], cached['title']
+    
     sp = get_spotify_client()
     
     results = []
@@ -59,7 +498,7 @@ def search_spotify(query, search_type):
             response = sp.search(q=query, type=spotify_type, limit=50)
             items = response['tracks']['items']
             for item in items:
-                results.append(f"{item['name']} - {', '.join(artist['name'] for artist in item['artists'])}")
+                results.append(Track.from_spotify(item))
             if items and items[0]['album']['images']:
                 cover_url = items[0]['album']['images'][0]['url']
         
@@ -73,7 +512,7 @@ def search_spotify(query, search_type):
                 if items and items[0]['id'] and not results:
                     top_tracks = sp.artist_top_tracks(items[0]['id'])
                     for track in top_tracks['tracks']:
-                        results.append(f"{track['name']} - {', '.join(artist['name'] for artist in track['artists'])}")
+                        results.append(Track.from_spotify(track))
             if items and items[0]['images']:
                 cover_url = items[0]['images'][0]['url']
         
@@ -82,23 +521,117 @@ def search_spotify(query, search_type):
             response = sp.search(q=query, type=spotify_type, limit=20)
             items = response['albums']['items']
             
-            for album in items:
+            # Obtener las canciones de todos los álbumes en una sola tanda
+            albums = _expand_albums(sp, [album['id'] for album in items])
+            
+            for album in albums:
                 results.append(f"ÁLBUM: {album['name']} - {', '.join(artist['name'] for artist in album['artists'])}")
-                
-                # Obtener las canciones del álbum
-                album_tracks = sp.album_tracks(album['id'])
-                for track in album_tracks['items']:
-                    results.append(f"  • {track['name']} - {', '.join(artist['name'] for artist in track['artists'])}")
+                for track in album['tracks']['items']:
+                    results.append(Track.from_spotify(track, album))
             
             if items and items[0]['images']:
                 cover_url = items[0]['images'][0]['url']
         
+        if cache:
+            cache.set(cache_key, {'results': _dump_entries(results), 'cover_url': cover_url, 'title': title})
+        
+        remember_tracks(results)
         return results, cover_url, title
     
     except Exception as e:
         messagebox.showerror("Error", f"Error al buscar en Spotify: {e}")
         return [], None, f"Error en la búsqueda: {query}"
 
+def iter_tracks_from_url(url, lean=SPOTIFY_LEAN_FETCH):
+    """
+    Obtiene las pistas de una URL de Spotify (álbum o playlist) por lotes
+    
+    Cada lote se entrega en cuanto llega su página, de modo que la interfaz
+    puede mostrar las primeras pistas sin esperar al resto.
+    
+    Args:
+        url (str): URL de Spotify
+        lean (bool, optional): Pedir solo los campos necesarios y fijar el mercado
+    
+    Yields:
+        tuple: (pistas del lote, url_portada, título)
+    
+    Raises:
+        ValueError: Si la URL no es de un álbum o playlist
+    """
+    sp = get_spotify_client()
+    cache = _get_cache()
+    kind, resource_id = _parse_spotify_url(url)
+    
+    if kind == 'album':
+        # Los álbumes no cambian: se guardan en la caché indefinidamente
+        cache_key = f"album:{resource_id}"
+        cached, _ = cache.get(cache_key) if cache else (None, None)
+        if cached:
+            tracks = [as_track(track) for track in _load_entries(cached['tracks'])]
+            remember_tracks(tracks)
+            yield tracks, cached['cover_url'], cached['title']
+            return
+        
+        # El álbum ya incluye la primera página de pistas
+        album_market = SPOTIFY_MARKET if lean else None
+        album_info = sp.album(resource_id, market=album_market)
+        cover_url = album_info['images'][0]['url'] if album_info['images'] else None
+        title = f"{album_info['name']} - {album_info['artists'][0]['name']}"
+        pages = _iter_pages(
+            album_info['tracks'],
+            lambda offset: sp.album_tracks(resource_id, limit=ALBUM_TRACKS_PAGE_SIZE, offset=offset,
+                                           market=album_market),
+            ALBUM_TRACKS_PAGE_SIZE
+        )
+        tracks = []
+        for items in pages:
+            batch = [Track.from_spotify(item, album_info) for item in items]
+            remember_tracks(batch)
+            tracks.extend(batch)
+            yield batch, cover_url, title
+        
+        if cache:
+            cache.set(cache_key, {'tracks': _dump_entries(tracks), 'cover_url': cover_url, 'title': title})
+    
+    elif kind == 'playlist':
+        # Petición ligera: su snapshot_id indica si la playlist cambió desde la última vez
+        playlist_info = sp.playlist(resource_id, fields=PLAYLIST_INFO_FIELDS)
+        cover_url = playlist_info['images'][0]['url'] if playlist_info['images'] else None
+        title = playlist_info['name']
+        snapshot_id = playlist_info.get('snapshot_id')
+        
+        cache_key = f"playlist:{resource_id}"
+        cached, cached_snapshot = cache.get(cache_key) if cache else (None, None)
+        if cached is not None and snapshot_id and cached_snapshot == snapshot_id:
+            tracks = [as_track(track) for track in _load_entries(cached['tracks'])]
+            remember_tracks(tracks)
+            yield tracks, cover_url, title
+            return
+        
+        page_kwargs = _playlist_page_kwargs(lean)
+        pages = _iter_pages(
+            sp.playlist_tracks(resource_id, limit=PLAYLIST_PAGE_SIZE, **page_kwargs),
+            lambda offset: sp.playlist_tracks(resource_id, limit=PLAYLIST_PAGE_SIZE, offset=offset, **page_kwargs),
+            PLAYLIST_PAGE_SIZE
+        )
+        tracks = []
+        for items in pages:
+            batch = []
+            for item in items:
+                track = item.get('track')
+                if track and track['type'] == 'track':
+                    batch.append(Track.from_spotify(track))
+            remember_tracks(batch)
+            tracks.extend(batch)
+            yield batch, cover_url, title
+        
+        if cache and snapshot_id:
+            cache.set(cache_key, {'tracks': _dump_entries(tracks)}, version=snapshot_id)
+    
+    else:
+        raise ValueError("URL inválida. Debe ser un álbum o playlist de Spotify.")
+
 def get_tracks_from_url(url):
     """
     Obtiene las pistas desde una URL de Spotify (álbum o playlist)
@@ -109,104 +642,149 @@ def get_tracks_from_url(url):
     Returns:
         tuple: (pistas, url_portada, título)
     """
-    sp = get_spotify_client()
-    
     tracks = []
     cover_url = None
     title = ""
     
     try:
-        if 'album' in url:
-            album_id = re.search(r'album/([a-zA-Z0-9]+)', url).group(1)
-            results = sp.album_tracks(album_id)
-            album_info = sp.album(album_id)
-            cover_url = album_info['images'][0]['url'] if album_info['images'] else None
-            title = f"{album_info['name']} - {album_info['artists'][0]['name']}"
-            for item in results['items']:
-                tracks.append(f"{item['name']} - {', '.join(artist['name'] for artist in item['artists'])}")
-        elif 'playlist' in url:
-            playlist_id = re.search(r'playlist/([a-zA-Z0-9]+)', url).group(1)
-            results = sp.playlist_tracks(playlist_id)
-            playlist_info = sp.playlist(playlist_id)
-            cover_url = playlist_info['images'][0]['url'] if playlist_info['images'] else None
-            title = playlist_info['name']
-            while results:
-                for item in results['items']:
-                    track = item.get('track')
-                    if track and track['type'] == 'track':
-                        tracks.append(f"{track['name']} - {', '.join(artist['name'] for artist in track['artists'])}")
-                results = sp.next(results) if results['next'] else None
-        else:
-            messagebox.showerror("Error", "URL inválida. Debe ser un álbum o playlist de Spotify.")
-            return [], None, None
+        for batch, cover_url, title in iter_tracks_from_url(url):
+            tracks.extend(batch)
         return tracks, cover_url, title
+    except ValueError as e:
+        messagebox.showerror("Error", str(e))
+        return [], None, None
     except Exception as e:
         messagebox.showerror("Error", f"Error al obtener datos de Spotify: {e}")
         return [], None, None
     
-def get_track_details(track_name):
+def get_track_details(track):
     """
     Obtiene detalles completos de una canción desde Spotify
     
     Args:
-        track_name (str): Nombre de la canción en formato "titulo - artista"
+        track (Track | str): Pista o nombre de la canción en formato "titulo - artista"
     
     Returns:
         dict: Diccionario con los detalles de la canción o None si no se encuentra
     """
-    if not track_name:
+    if not track:
         return None
     
-    sp = get_spotify_client()
+    track = as_track(track)
     
     try:
-        # Separar título y artista
-        parts = track_name.split(" - ", 1)
-        title = parts[0].strip()
-        artist = parts[1].strip() if len(parts) > 1 else ""
-        
-        # Construir la consulta
-        query = f"track:{title}"
-        if artist:
-            query += f" artist:{artist}"
+        if track.id:
+            # La pista viene de Spotify: se lee de memoria o se resuelve por ID
+            stored = resolve_tracks([track.id]).get(track.id)
+            return _track_details_from_record(stored) if stored else None
         
-        # Buscar la canción
-        results = sp.search(q=query, type="track", limit=1)
+        item = _search_track(get_spotify_client(), track)
+        if item is None:
+            return None
         
-        if not results['tracks']['items']:
-            # Intentar una búsqueda más general si no hay resultados
-            results = sp.search(q=track_name, type="track", limit=1)
-            
-            if not results['tracks']['items']:
-                return None
-        
-        # Obtener el primer resultado
-        track = results['tracks']['items'][0]
-        
-        # Formatear duración a minutos:segundos
-        duration_ms = track['duration_ms']
-        minutes = duration_ms // 60000
-        seconds = (duration_ms % 60000) // 1000
-        duration_str = f"{minutes}:{seconds:02d}"
-        
-        # Construir diccionario de detalles
-        details = {
-            'id': track['id'],
-            'name': track['name'],
-            'artists': [artist['name'] for artist in track['artists']],
-            'album': {
-                'name': track['album']['name'],
-                'release_date': track['album']['release_date'],
-                'images': [img['url'] for img in track['album']['images']] if track['album']['images'] else []
-            },
-            'duration': duration_str,
-            'duration_ms': duration_ms,
-            'popularity': track['popularity'],
-            'url': track['external_urls']['spotify'] if 'external_urls' in track else None
-        }
-        
-        return details
+        remember_tracks([Track.from_spotify(item)])
+        return _build_track_details(item)
     
     except Exception as e:
         print(f"Error al obtener detalles de la canción: {e}")
-        return None
\ No newline at end of file
+        return None
+
+def _search_track(sp, track):
+    """
+    Busca en Spotify una pista de la que solo se conoce el título y los artistas
+    
+    Args:
+        sp (spotipy.Spotify): Cliente de Spotify
+        track (Track): Pista sin ID
+    
+    Returns:
+        dict: Pista encontrada o None
+    """
+    # Construir la consulta
+    query = f"track:{track.title}"
+    if track.artists:
+        query += f" artist:{track.artist}"
+    
+    # Buscar la canción
+    results = sp.search(q=query, type="track", limit=1)
+    
+    if not results['tracks']['items']:
+        # Intentar una búsqueda más general si no hay resultados
+        results = sp.search(q=str(track), type="track", limit=1)
+        
+        if not results['tracks']['items']:
+            return None
+    
+    # Obtener el primer resultado
+    return results['tracks']['items'][0]
+
+def _format_duration(duration_ms):
+    """
+    Formatea una duración a minutos:segundos
+    
+    Args:
+        duration_ms (int): Duración en milisegundos
+    
+    Returns:
+        str: Duración formateada
+    """
+    minutes = duration_ms // 60000
+    seconds = (duration_ms % 60000) // 1000
+    return f"{minutes}:{seconds:02d}"
+
+def _track_details_from_record(track):
+    """
+    Construye el diccionario de detalles a partir de una pista ya conocida, sin red
+    
+    Args:
+        track (Track): Pista con ID
+    
+    Returns:
+        dict: Detalles de la canción
+    """
+    return {
+        'id': track.id,
+        'name': track.title,
+        'artists': list(track.artists),
+        'album': {
+            'name': track.album or "",
+            'release_date': track.release_date or "",
+            'images': [track.cover_url] if track.cover_url else []
+        },
+        'duration': _format_duration(track.duration_ms) if track.duration_ms is not None else "N/A",
+        'duration_ms': track.duration_ms,
+        'popularity': track.popularity,
+        'url': f"https://open.spotify.com/track/{track.id}"
+    }
+
+def _build_track_details(track):
+    """
+    Construye el diccionario de detalles que muestra la interfaz
+    
+    Args:
+        track (dict): Pista completa de Spotify
+    
+    Returns:
+        dict: Detalles de la canción
+    """
+    # Formatear duración a minutos:segundos
+    duration_ms = track['duration_ms']
+    duration_str = _format_duration(duration_ms)
+    
+    # Construir diccionario de detalles
+    details = {
+        'id': track['id'],
+        'name': track['name'],
+        'artists': [artist['name'] for artist in track['artists']],
+        'album': {
+            'name': track['album']['name'],
+            'release_date': track['album']['release_date'],
+            'images': [img['url'] for img in track['album']['images']] if track['album']['images'] else []
+        },
+        'duration': duration_str,
+        'duration_ms': duration_ms,
+        'popularity': track['popularity'],
+        'url': track['external_urls']['spotify'] if 'external_urls' in track else None
+    }
+    
+    return details
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Listify - Sincronización de una carpeta con una playlist de Spotify
+"""
+import os
+import shutil
+from tkinter import messagebox
+from services.file_service import get_unique_filename
+from services.manifest_service import get_manifest
+from services.spotify_service import get_source_key, get_tracks_from_url
+from services.track import track_key
+from services.youtube_service import download_tracks
+
+# Subcarpeta a la que se mueven las pistas que ya no están en la playlist
+ARCHIVE_DIRNAME = 'Archivo'
+
+class PlaylistDiff:
+    """Diferencias entre una playlist y lo que ya hay descargado en una carpeta"""
+    __slots__ = ('added', 'removed', 'unchanged')
+
+    def __init__(self, added, removed, unchanged):
+        self.added = added
+        self.removed = removed
+        self.unchanged = unchanged
+
+    def __str__(self):
+        return f"+{len(self.added)} nuevas, -{len(self.removed)} eliminadas, ={self.unchanged} sin cambios"
+
+def diff_playlist(tracks, manifest, source):
+    """
+    Compara las pistas de una playlist con el manifiesto de la carpeta
+
+    Solo consulta el manifiesto (y el tamaño de cada archivo); los archivos
+    sin cambios no se abren. Solo cuentan como eliminadas las pistas que se
+    descargaron desde esta misma playlist: las de otras listas o canciones
+    sueltas que compartan la carpeta no se tocan.
+
+    Args:
+        tracks (list): Pistas actuales de la playlist
+        manifest (DownloadManifest): Manifiesto de la carpeta
+        source (str): Playlist o álbum de origen (ver spotify_service.get_source_key)
+
+    Returns:
+        PlaylistDiff: Pistas nuevas, claves eliminadas y número de pistas sin cambios
+    """
+    current = {}
+    for track in tracks:
+        current.setdefault(track_key(track), track)
+
+    added = [track for track in current.values() if not manifest.get_file(track)]
+    removed = [key for key, entry in list(manifest.entries.items())
+               if key not in current and source in entry.get('sources', ())]
+    unchanged = len(current) - len(added)
+
+    return PlaylistDiff(added, removed, unchanged)
+
+def archive_removed(manifest, keys, source):
+    """
+    Mueve a la subcarpeta de archivo las pistas que salieron de la playlist
+
+    Una pista que sigue perteneciendo a otra playlist de la carpeta no se
+    mueve; solo deja de figurar como parte de esta.
+
+    Args:
+        manifest (DownloadManifest): Manifiesto de la carpeta
+        keys (list): Claves de las pistas eliminadas
+        source (str): Playlist o álbum de origen
+
+    Returns:
+        int: Número de archivos movidos
+    """
+    archive_dir = os.path.join(manifest.folder, ARCHIVE_DIRNAME)
+    moved = 0
+
+    for key in keys:
+        entry = manifest.entries.get(key)
+        if not entry or manifest.remove_source(key, source):
+            continue
+
+        file_path = os.path.join(manifest.folder, entry['path'])
+        if os.path.exists(file_path):
+            os.makedirs(archive_dir, exist_ok=True)
+            archive_name = get_unique_filename(archive_dir, os.path.basename(file_path))
+            shutil.move(file_path, os.path.join(archive_dir, archive_name))
+            moved += 1
+        manifest.remove(key)
+
+    manifest.save()
+    return moved
+
+def sync_playlist(url, destino, root, shared_vars, archive=False):
+    """
+    Sincroniza una carpeta con una playlist: descarga solo las pistas nuevas
+
+    Args:
+        url (str): URL de la playlist o álbum de Spotify
+        destino (str): Carpeta destino
+        root (tk.Tk): Objeto raíz de tkinter
+        shared_vars (dict): Variables compartidas
+        archive (bool, optional): Mover a la subcarpeta de archivo las pistas eliminadas
+    """
+    root.after(0, lambda: shared_vars['current_task'].set("Sincronizando..."))
+    root.after(0, lambda: shared_vars['status_text'].set("Obteniendo la playlist de Spotify..."))
+
+    tracks, cover_url, title = get_tracks_from_url(url)
+    if not tracks:
+        root.after(0, lambda: shared_vars['current_task'].set(""))
+        return
+
+    source = get_source_key(url)
+    manifest = get_manifest(destino)
+    diff = diff_playlist(tracks, manifest, source)
+    summary = str(diff)
+    root.after(0, lambda: shared_vars['status_text'].set(f"Sincronización: {summary}"))
+
+    # Las pistas que ya estaban (descargadas sueltas o desde otra lista) pasan a ser de esta también
+    added_keys = {track_key(track) for track in diff.added}
+    for track in tracks:
+        if track_key(track) not in added_keys:
+            manifest.add_source(track, source)
+
+    moved = archive_removed(manifest, diff.removed, source) if archive and diff.removed else 0
+    manifest.save()
+
+    if diff.added:
+        # download_tracks informa del progreso y del resultado de las descargas
+        download_tracks(diff.added, destino, root, shared_vars, cover_url, title, source=source)
+        root.after(0, lambda: shared_vars['current_task'].set(f"Sincronización finalizada: {summary}"))
+        return
+
+    message = f"{title}\n{summary}"
+    if moved:
+        message += f"\n{moved} archivos movidos a {ARCHIVE_DIRNAME}"
+
+    root.after(0, lambda: shared_vars['current_task'].set("Sincronización finalizada"))
+    root.after(0, lambda: shared_vars['progress_var'].set(100))
+    root.after(0, lambda: messagebox.showinfo("Sincronización completada", message))
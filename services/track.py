@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Listify - Modelo de pista
+"""
+import re
+import unicodedata
+
+class Track:
+    """Pista de Spotify con los datos que usan la búsqueda, la importación y la descarga"""
+    __slots__ = ('id', 'title', 'artists', 'album', 'album_id', 'release_date',
+                 'duration_ms', 'isrc', 'track_number', 'cover_url', 'popularity')
+
+    def __init__(self, title, artists=(), id=None, album=None, album_id=None, release_date=None,
+                 duration_ms=None, isrc=None, track_number=None, cover_url=None, popularity=None):
+        self.id = id
+        self.title = title
+        self.artists = tuple(artists)
+        self.album = album
+        self.album_id = album_id
+        self.release_date = release_date
+        self.duration_ms = duration_ms
+        self.isrc = isrc
+        self.track_number = track_number
+        self.cover_url = cover_url
+        self.popularity = popularity
+
+    def __str__(self):
+        # Formato que se muestra en la lista y se usa para buscar en YouTube
+        if self.artists:
+            return f"{self.title} - {self.artist}"
+        return self.title
+
+    def __repr__(self):
+        return f"Track({str(self)!r}, id={self.id!r})"
+
+    @property
+    def artist(self):
+        """str: Artistas separados por comas"""
+        return ', '.join(self.artists)
+
+    @property
+    def year(self):
+        """str: Año de lanzamiento o None si no se conoce"""
+        return self.release_date.split('-')[0] if self.release_date else None
+
+    @classmethod
+    def from_spotify(cls, item, album=None):
+        """
+        Crea una pista a partir de un objeto de pista de Spotify
+
+        Args:
+            item (dict): Pista devuelta por la API (completa o simplificada)
+            album (dict, optional): Álbum al que pertenece, para las pistas simplificadas
+                que no lo incluyen (p. ej. las de album_tracks)
+
+        Returns:
+            Track: Pista creada
+        """
+        album = item.get('album') or album or {}
+        images = album.get('images') or []
+
+        return cls(
+            title=item.get('name', ''),
+            artists=[artist['name'] for artist in item.get('artists') or []],
+            id=item.get('id'),
+            album=album.get('name'),
+            album_id=album.get('id'),
+            release_date=album.get('release_date'),
+            duration_ms=item.get('duration_ms'),
+            isrc=(item.get('external_ids') or {}).get('isrc'),
+            track_number=item.get('track_number'),
+            cover_url=images[0]['url'] if images else None,
+            popularity=item.get('popularity')
+        )
+
+    @classmethod
+    def from_display(cls, text):
+        """
+        Crea una pista a partir de un texto en formato "título - artistas"
+
+        Args:
+            text (str): Texto de la pista
+
+        Returns:
+            Track: Pista creada, sin ID de Spotify
+        """
+        parts = text.split(' - ', 1)
+        title = parts[0].strip()
+        artists = [artist.strip() for artist in parts[1].split(',')] if len(parts) > 1 else []
+        return cls(title=title, artists=[artist for artist in artists if artist])
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Crea una pista a partir del diccionario generado por to_dict
+
+        Args:
+            data (dict): Datos de la pista
+
+        Returns:
+            Track: Pista creada
+        """
+        return cls(**{slot: data[slot] for slot in cls.__slots__ if slot in data})
+
+    def to_dict(self):
+        """
+        Convierte la pista en un diccionario serializable a JSON
+
+        Returns:
+            dict: Campos de la pista con valor
+        """
+        data = {}
+        for slot in self.__slots__:
+            value = getattr(self, slot)
+            if value is not None:
+                data[slot] = list(value) if slot == 'artists' else value
+        return data
+
+def as_track(value):
+    """
+    Convierte un texto "título - artistas" en pista; las pistas se devuelven tal cual
+
+    Args:
+        value (Track | str): Pista o texto
+
+    Returns:
+        Track: Pista
+    """
+    return value if isinstance(value, Track) else Track.from_display(value)
+
+def normalize_text(text):
+    """
+    Normaliza un texto para compararlo: minúsculas, sin acentos ni signos de puntuación
+
+    Args:
+        text (str): Texto original
+
+    Returns:
+        str: Texto normalizado
+    """
+    text = unicodedata.normalize('NFKD', text.lower())
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    text = re.sub(r'[^\w\s]', ' ', text)
+    return ' '.join(text.split())
+
+def track_key(track):
+    """
+    Obtiene una clave estable para identificar una pista entre ejecuciones
+
+    Usa el ID de Spotify o el ISRC si se conocen y, si no, el texto
+    "título - artistas" normalizado.
+
+    Args:
+        track (Track | str): Pista o texto
+
+    Returns:
+        str: Clave de la pista
+    """
+    track = as_track(track)
+    if track.id:
+        return f"spotify:{track.id}"
+    if track.isrc:
+        return f"isrc:{track.isrc}"
+    return f"name:{normalize_text(str(track))}"
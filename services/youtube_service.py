@@ -5,192 +5,774 @@ Listify - Servicio de YouTube
 """
 import os
 import re
-import time
+import glob
+import threading
+import subprocess
 from tkinter import messagebox
 from youtubesearchpython import VideosSearch
 import yt_dlp
-from services.metadata_service import get_basic_metadata, add_metadata_to_file, fix_mp3_file
+from config import (DOWNLOAD_WORKERS, FFMPEG_PATH, OUTPUT_FORMAT, TRANSCODE_NICE, SINGLE_PASS_TAGGING,
+                    ID3_PADDING, YOUTUBE_MATCH_CACHE_ENABLED, MATCH_CANDIDATES, MATCH_MIN_SCORE)
+from services.cache_service import get_youtube_match_cache
+from services.job_queue import get_job_queue
+from services.track import as_track, normalize_text, track_key
+from services.metadata_service import (STAGING_DIRNAME, get_processed_cover, add_metadata_to_file,
+                                       fix_mp3_file)
 
-def search_youtube(query, limit=1):
+YOUTUBE_WATCH_URL = "https://www.youtube.com/watch?v={}"
+
+# Stream de YouTube preferido para cada formato de salida: con "opus" y "m4a"
+# se elige el que ya trae ese códec para poder copiarlo sin recodificar
+AUDIO_STREAM_FORMATS = {
+    'mp3': 'bestaudio/best',
+    'opus': 'bestaudio[acodec=opus]/bestaudio/best',
+    'm4a': 'bestaudio[ext=m4a]/bestaudio/best',
+}
+
+# Códec con el que se recodifica si el stream descargado no cabe en el contenedor
+FALLBACK_CODECS = {
+    'opus': ['-codec:a', 'libopus', '-b:a', '160k'],
+    'm4a': ['-codec:a', 'aac', '-b:a', '192k'],
+}
+
+# Nombre de cada metadato para la opción -metadata de ffmpeg
+FFMPEG_METADATA_TAGS = {
+    'title': 'title',
+    'artist': 'artist',
+    'album': 'album',
+    'year': 'date',
+    'track_number': 'track',
+    'genre': 'genre',
+}
+
+# Opciones de yt-dlp para descargar solo el audio, sin conversión
+YDL_OPTIONS = {
+    'format': AUDIO_STREAM_FORMATS.get(OUTPUT_FORMAT, 'bestaudio/best'),
+    'outtmpl': '%(id)s.%(ext)s',
+    'quiet': True,
+    'no_warnings': True,
+    # Retomar los .part que quedaron en la carpeta temporal tras un cierre a medias
+    'continuedl': True,
+    'nopart': False
+}
+
+# Palabras que delatan versiones distintas de la original (si no aparecen en el título de la pista)
+VERSION_WORDS = {
+    'live', 'vivo', 'concierto', 'concert', 'cover', 'karaoke', 'instrumental', 'remix',
+    'sped', 'slowed', 'reverb', '8d', 'nightcore', 'hour', 'hours', 'hora', 'horas',
+    'compilation', 'mix', 'megamix', 'reaction', 'tutorial', 'acoustic', 'acustico'
+}
+# Frases con el mismo efecto ("full" suelto aparece en "[Full HD]" de videos oficiales)
+VERSION_PHRASES = ('full album', 'album completo')
+
+# Margen de duración: se rechaza una diferencia mayor que el máximo de ambos valores
+DURATION_TOLERANCE_SECONDS = 30
+DURATION_TOLERANCE_RATIO = 0.15
+# Sin duración de referencia, se descartan videos más largos que esto (recopilatorios)
+MAX_UNKNOWN_DURATION_SECONDS = 15 * 60
+
+def _parse_duration(text):
     """
-    Busca un video en YouTube
+    Convierte una duración "h:mm:ss" o "m:ss" a segundos
     
     Args:
-        query (str): Término de búsqueda
-        limit (int, optional): Límite de resultados. Por defecto es 1.
+        text (str): Duración en texto
     
     Returns:
-        dict: Primer resultado de búsqueda
+        int: Segundos o None si no se puede interpretar (p. ej. directos)
     """
+    if not text:
+        return None
     try:
-        search = VideosSearch(query, limit=limit)
-        results = search.result()
-        return results['result'][0] if results['result'] else None
+        seconds = 0
+        for part in text.split(':'):
+            seconds = seconds * 60 + int(part)
+        return seconds
+    except ValueError:
+        return None
+
+def score_candidate(candidate, track):
+    """
+    Puntúa un resultado de YouTube como posible versión de una pista
+    
+    Combina la diferencia de duración con la de Spotify, las palabras del
+    título y de los artistas presentes en el video y las señales del canal
+    ("- Topic", "VEVO"). Las coincidencias claramente incorrectas se rechazan.
+    
+    Args:
+        candidate (dict): Resultado de VideosSearch
+        track (Track | str): Pista buscada
+    
+    Returns:
+        float: Puntuación entre 0 y 1, o None si el video se rechaza
+    """
+    track = as_track(track)
+    video_title = normalize_text(candidate.get('title') or '')
+    channel = (candidate.get('channel') or {}).get('name') or ''
+    channel_norm = normalize_text(channel)
+    video_words = set(video_title.split())
+    
+    # Duración
+    duration = _parse_duration(candidate.get('duration'))
+    if track.duration_ms:
+        if duration is None:
+            return None
+        expected = track.duration_ms / 1000
+        difference = abs(duration - expected)
+        if difference > max(DURATION_TOLERANCE_SECONDS, expected * DURATION_TOLERANCE_RATIO):
+            return None
+        duration_score = max(0.0, 1 - difference / DURATION_TOLERANCE_SECONDS)
+    else:
+        if duration is not None and duration > MAX_UNKNOWN_DURATION_SECONDS:
+            return None
+        duration_score = 0.5
+    
+    # Título
+    title_words = set(normalize_text(track.title).split())
+    if not title_words:
+        return None
+    title_score = len(title_words & video_words) / len(title_words)
+    if title_score == 0:
+        return None
+    
+    # Artistas (en el título del video o en el nombre del canal)
+    artist_words = set(normalize_text(track.artist).split())
+    if artist_words:
+        artist_score = len(artist_words & (video_words | set(channel_norm.split()))) / len(artist_words)
+    else:
+        artist_score = 0.5
+    
+    score = 0.4 * duration_score + 0.35 * title_score + 0.25 * artist_score
+    
+    # Señales del canal
+    if channel.endswith(' - Topic'):
+        score += 0.15
+    elif 'vevo' in channel_norm:
+        score += 0.1
+    
+    # Versiones alternativas que no se pidieron
+    unwanted = (VERSION_WORDS & video_words) - title_words
+    unwanted_phrases = [phrase for phrase in VERSION_PHRASES
+                        if phrase in video_title and phrase not in normalize_text(track.title)]
+    score -= 0.3 * (len(unwanted) + len(unwanted_phrases))
+    
+    return max(0.0, min(1.0, score))
+
+def search_youtube_match(track, limit=MATCH_CANDIDATES):
+    """
+    Busca en YouTube la mejor versión de una pista entre varios resultados
+    
+    Args:
+        track (Track | str): Pista a buscar
+        limit (int, optional): Número de resultados a comparar
+    
+    Returns:
+        tuple: (mejor resultado, puntuación) o (None, None) si ninguno es aceptable
+    """
+    try:
+        search = VideosSearch(str(track), limit=limit)
+        candidates = search.result()['result']
     except Exception as e:
         print(f"Error al buscar en YouTube: {e}")
+        return None, None
+    
+    best, best_score = None, None
+    for candidate in candidates:
+        score = score_candidate(candidate, track)
+        if score is not None and (best_score is None or score > best_score):
+            best, best_score = candidate, score
+    
+    if best is None or best_score < MATCH_MIN_SCORE:
+        return None, None
+    return best, best_score
+
+def _get_match_cache():
+    """
+    Obtiene la caché de coincidencias si está habilitada
+    
+    Returns:
+        YouTubeMatchCache: Caché de coincidencias o None si está deshabilitada o no disponible
+    """
+    if not YOUTUBE_MATCH_CACHE_ENABLED:
+        return None
+    try:
+        return get_youtube_match_cache()
+    except Exception as e:
+        print(f"Caché de coincidencias no disponible: {e}")
         return None
 
-def download_audio(video_url, output_path, filename, cover_url=None, album_name=None):
+def find_youtube_video(track, use_cache=True):
     """
-    Descarga el audio de un video de YouTube
+    Obtiene la URL del video de YouTube de una pista, usando la caché si ya se buscó antes
     
     Args:
-        video_url (str): URL del video
-        output_path (str): Ruta de salida
-        filename (str): Nombre del archivo
-        cover_url (str, optional): URL de la imagen de portada
-        album_name (str, optional): Nombre del álbum
+        track (Track | str): Pista a buscar
+        use_cache (bool, optional): Consultar la caché antes de buscar
     
     Returns:
-        bool: True si se descargó correctamente, False en caso contrario
+        tuple: (url del video o None, True si la URL salió de la caché)
     """
-    try:
-        # Sanitizar nombre de archivo y eliminar .mp3 si ya está en el nombre
-        safe_name = re.sub(r'[\\/*?:"<>|]', "_", filename)
-        if safe_name.lower().endswith('.mp3'):
-            safe_name = safe_name[:-4]
-        
-        # Normalizar la ruta
-        output_path = os.path.normpath(output_path)
-        output_file = os.path.normpath(os.path.join(output_path, f"{safe_name}.mp3"))
-        
-        # Verificar que el directorio de salida existe
-        if not os.path.exists(output_path):
-            os.makedirs(output_path, exist_ok=True)
-        
-        # Eliminar el archivo si ya existe
-        if os.path.exists(output_file):
-            os.remove(output_file)
+    cache = _get_match_cache()
+    key = track_key(track)
+    
+    if cache and use_cache:
+        video_id, _ = cache.get(key)
+        if video_id:
+            return YOUTUBE_WATCH_URL.format(video_id), True
+    
+    video, score = search_youtube_match(track)
+    if not video:
+        return None, False
+    
+    if cache and video.get('id'):
+        cache.set(key, video['id'], score)
+    return video['link'], False
+
+def forget_youtube_video(track):
+    """
+    Invalida la coincidencia guardada de una pista (p. ej. si el video ya no está disponible)
+    
+    Args:
+        track (Track | str): Pista
+    """
+    cache = _get_match_cache()
+    if cache:
+        cache.invalidate(track_key(track))
+
+def get_output_file(output_path, track, output_format=OUTPUT_FORMAT):
+    """
+    Calcula la ruta del archivo de audio final de una pista
+    
+    Args:
+        output_path (str): Carpeta de salida
+        track (Track | str): Pista; su texto "título - artistas" da nombre al archivo
+        output_format (str, optional): Formato de salida ("mp3", "opus" o "m4a")
+    
+    Returns:
+        tuple: (nombre base sanitizado, ruta del archivo de audio)
+    """
+    extension = f".{output_format if output_format in AUDIO_STREAM_FORMATS else 'mp3'}"
+    
+    # Sanitizar nombre de archivo y eliminar la extensión si ya está en el nombre
+    safe_name = re.sub(r'[\\/*?:"<>|]', "_", str(track))
+    if safe_name.lower().endswith(('.mp3', extension)):
+        safe_name = os.path.splitext(safe_name)[0]
+    
+    output_file = os.path.normpath(os.path.join(output_path, f"{safe_name}{extension}"))
+    return safe_name, output_file
+
+def get_staging_dir(output_path):
+    """
+    Obtiene (y crea) la carpeta donde se guardan los audios sin procesar
+    
+    Args:
+        output_path (str): Carpeta de salida
+    
+    Returns:
+        str: Ruta de la carpeta temporal
+    """
+    staging_dir = os.path.join(os.path.normpath(output_path), STAGING_DIRNAME)
+    os.makedirs(staging_dir, exist_ok=True)
+    return staging_dir
+
+class YoutubeDLSession:
+    """
+    Instancias de YoutubeDL reutilizadas durante todo un lote de descargas
+    
+    Cada hilo obtiene su propia instancia la primera vez que descarga y la
+    conserva hasta cerrar la sesión, de modo que los extractores y las
+    conexiones HTTP se inicializan una vez por hilo y no una vez por pista.
+    """
+    def __init__(self, options=None):
+        self.options = dict(YDL_OPTIONS, **(options or {}))
+        self._local = threading.local()
+        self._instances = []
+        self._lock = threading.Lock()
+    
+    def _get_instance(self):
+        """Obtiene la instancia del hilo actual, creándola si no existe"""
+        ydl = getattr(self._local, 'ydl', None)
+        if ydl is None:
+            # Los hooks anotan la ruta final que yt-dlp da a cada archivo
+            state = {'filepath': None}
+            
+            def progress_hook(d):
+                if d.get('status') == 'finished' and d.get('filename'):
+                    state['filepath'] = d['filename']
             
-        # También verificar y eliminar si existe con doble extensión
-        double_ext_file = f"{output_file}.mp3"
-        if os.path.exists(double_ext_file):
-            os.remove(double_ext_file)
+            def postprocessor_hook(d):
+                if d.get('status') == 'finished':
+                    filepath = (d.get('info_dict') or {}).get('filepath')
+                    if filepath:
+                        state['filepath'] = filepath
+            
+            options = dict(self.options)
+            options['progress_hooks'] = [progress_hook]
+            options['postprocessor_hooks'] = [postprocessor_hook]
+            
+            ydl = yt_dlp.YoutubeDL(options)
+            self._local.ydl = ydl
+            self._local.state = state
+            with self._lock:
+                self._instances.append(ydl)
+        return ydl
+    
+    def download(self, video_url, outtmpl):
+        """
+        Descarga un video con la plantilla de salida indicada
         
-        # Opciones para yt-dlp
-        ydl_opts = {
-            'format': 'bestaudio/best',
-            'outtmpl': output_file,
-            'postprocessors': [{
-                'key': 'FFmpegExtractAudio',
-                'preferredcodec': 'mp3',
-                'preferredquality': '320',
-            }],
-            'quiet': True,
-            'no_warnings': True
-        }
+        Args:
+            video_url (str): URL del video
+            outtmpl (str): Plantilla de salida de esta pista
         
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            ydl.download([video_url])
+        Returns:
+            str: Ruta final del archivo según los hooks de yt-dlp, o None si no se completó
+        """
+        ydl = self._get_instance()
+        state = self._local.state
+        state['filepath'] = None
         
-        # Esperar un momento para que el sistema de archivos se actualice
-        time.sleep(1)
+        # Cambiar solo la plantilla por defecto: el resto de la configuración se conserva
+        templates = getattr(ydl, 'outtmpl_dict', None)
+        if not isinstance(templates, dict):
+            templates = ydl.params['outtmpl']
+        templates['default'] = outtmpl
         
-        # Verificar archivos y corregir extensiones
-        if os.path.exists(output_file):
+        ydl.extract_info(video_url, download=True)
+        return state['filepath']
+    
+    def close(self):
+        """Cierra todas las instancias de la sesión"""
+        with self._lock:
+            instances, self._instances = self._instances, []
+        for ydl in instances:
+            try:
+                ydl.close()
+            except Exception:
+                pass
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+
+def fetch_audio_stream(video_url, staging_dir, name, session=None):
+    """
+    Descarga el mejor audio de un video de YouTube sin convertirlo (etapa de red)
+    
+    Args:
+        video_url (str): URL del video
+        staging_dir (str): Carpeta temporal
+        name (str): Nombre base del archivo
+        session (YoutubeDLSession, optional): Sesión a reutilizar; sin ella se crea
+            una instancia de YoutubeDL solo para esta descarga
+    
+    Returns:
+        str: Ruta del audio descargado o None si falló
+    """
+    # yt-dlp interpreta '%' como parte de la plantilla. El video y el formato van en
+    # el nombre para que un .part solo se retome con los bytes del mismo stream
+    template_name = name.replace('%', '%%')
+    outtmpl = os.path.join(staging_dir, f"{template_name}.%(id)s.%(format_id)s.%(ext)s")
+    
+    if session is not None:
+        return session.download(video_url, outtmpl)
+    
+    with YoutubeDLSession() as single_session:
+        return single_session.download(video_url, outtmpl)
+
+def discard_partial_downloads(staging_dir, name, video_url):
+    """
+    Elimina las descargas a medias de un video en la carpeta temporal
+    
+    Se usa al descartar un video guardado en caché, para que su .part no
+    quede huérfano en la carpeta temporal.
+    
+    Args:
+        staging_dir (str): Carpeta temporal
+        name (str): Nombre base del archivo
+        video_url (str): URL del video descartado
+    """
+    match = re.search(r'[?&]v=([\w-]+)', video_url or '')
+    if not match:
+        return
+    
+    pattern = os.path.join(glob.escape(staging_dir), f"{glob.escape(name)}.{match.group(1)}.*")
+    for partial_file in glob.glob(pattern):
+        try:
+            os.remove(partial_file)
+        except OSError as e:
+            print(f"No se pudo eliminar {partial_file}: {e}")
+
+def _run_ffmpeg(command):
+    """
+    Ejecuta ffmpeg en su propio proceso con prioridad reducida
+    
+    Con TRANSCODE_NICE > 0 el sistema da preferencia a la interfaz y a las
+    descargas frente a las conversiones, aunque ocupen todos los núcleos.
+    
+    Args:
+        command (list): Comando completo de ffmpeg
+    
+    Returns:
+        tuple: (código de salida, salida de error)
+    """
+    kwargs = {}
+    if TRANSCODE_NICE > 0 and os.name == 'nt':
+        kwargs['creationflags'] = subprocess.BELOW_NORMAL_PRIORITY_CLASS
+    
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, **kwargs)
+    if TRANSCODE_NICE > 0 and hasattr(os, 'setpriority'):
+        try:
+            os.setpriority(os.PRIO_PROCESS, process.pid, TRANSCODE_NICE)
+        except OSError:
             pass
-        elif os.path.exists(double_ext_file):
-            os.rename(double_ext_file, output_file)
-        else:
-            # Buscar cualquier archivo que comience con el nombre base
-            base_dir = os.path.dirname(output_file)
-            base_name = os.path.splitext(os.path.basename(output_file))[0]
+    
+    _, stderr = process.communicate()
+    return process.returncode, stderr.decode(errors='ignore').strip()
+
+def writes_tags_on_convert(output_file):
+    """
+    Indica si la conversión de este archivo escribe también etiquetas y portada
+    
+    Args:
+        output_file (str): Ruta del archivo final
+    
+    Returns:
+        bool: True si es un MP3 y está activado el etiquetado en una sola pasada
+    """
+    return SINGLE_PASS_TAGGING and output_file.lower().endswith('.mp3')
+
+def write_cover_file(cover_url, staging_dir, name):
+    """
+    Descarga la portada ya procesada a un archivo temporal para pasársela a ffmpeg
+    
+    Args:
+        cover_url (str): URL de la portada
+        staging_dir (str): Carpeta temporal
+        name (str): Nombre base del archivo
+    
+    Returns:
+        str: Ruta de la imagen o None si no se pudo obtener
+    """
+    cover = get_processed_cover(cover_url) if cover_url else None
+    if not cover:
+        return None
+    
+    cover_data, cover_type = cover
+    extension = '.png' if cover_type == 'image/png' else '.jpg'
+    cover_file = os.path.join(staging_dir, f"{name}.cover{extension}")
+    with open(cover_file, 'wb') as f:
+        f.write(cover_data)
+    return cover_file
+
+def _mp3_command(raw_file, temp_file, metadata=None, cover_file=None):
+    """Construye el comando de ffmpeg que genera el MP3, con etiquetas y portada si se indican"""
+    command = [FFMPEG_PATH, '-y', '-loglevel', 'error', '-i', raw_file]
+    
+    if cover_file:
+        command += [
+            '-i', cover_file,
+            '-map', '0:a:0', '-map', '1:v:0',
+            '-codec:v', 'copy', '-disposition:v', 'attached_pic',
+            '-metadata:s:v', 'title=Cover', '-metadata:s:v', 'comment=Cover (front)'
+        ]
+    else:
+        command += ['-vn']
+    
+    # Relleno tras la cabecera ID3 para poder reetiquetar después sin reescribir el audio
+    command += ['-codec:a', 'libmp3lame', '-b:a', '320k', '-metadata_header_padding', str(ID3_PADDING)]
+    
+    if metadata is not None:
+        # Solo las etiquetas de la pista, no las que trae el video de YouTube
+        command += ['-map_metadata', '-1', '-id3v2_version', '3']
+        for key, tag in FFMPEG_METADATA_TAGS.items():
+            if metadata.get(key):
+                command += ['-metadata', f"{tag}={metadata[key]}"]
+    
+    command.append(temp_file)
+    return command
+
+def transcode_to_mp3(raw_file, output_file, metadata=None, cover_file=None):
+    """
+    Convierte un audio a MP3 de 320 kbps con ffmpeg (etapa de CPU)
+    
+    El MP3 se escribe con un nombre temporal y se mueve a su destino al terminar,
+    de modo que nunca queda un archivo a medias con el nombre final. Con
+    metadata (y cover_file) ffmpeg escribe también las etiquetas ID3v2.3 y la
+    portada, así que el archivo final se genera en una sola escritura.
+    
+    Args:
+        raw_file (str): Audio descargado
+        output_file (str): Ruta del MP3 final
+        metadata (dict, optional): Metadatos a escribir durante la conversión
+        cover_file (str, optional): Imagen de portada ya procesada
+    
+    Returns:
+        bool: True si la conversión terminó correctamente
+    """
+    temp_file = f"{output_file}.tmp.mp3"
+    attempts = [cover_file, None] if cover_file else [None]
+    
+    try:
+        for cover in attempts:
+            returncode, stderr = _run_ffmpeg(_mp3_command(raw_file, temp_file, metadata, cover))
+            if returncode == 0:
+                os.replace(temp_file, output_file)
+                return True
             
-            potential_files = [f for f in os.listdir(base_dir) if f.startswith(base_name)]
+            # Si falla con portada se reintenta sin ella antes de dar la pista por perdida
+            print(f"Error al convertir {raw_file}: {stderr}")
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+        return False
+    finally:
+        if os.path.exists(raw_file):
+            os.remove(raw_file)
+        if cover_file and os.path.exists(cover_file):
+            os.remove(cover_file)
+
+def remux_audio(raw_file, output_file):
+    """
+    Copia el audio descargado a su contenedor final sin recodificarlo
+    
+    Solo se cambia el contenedor (Ogg/Opus o M4A), así que cuesta una
+    fracción de la conversión a MP3. Si el códec del stream no cabe en el
+    contenedor pedido se recodifica como último recurso.
+    
+    Args:
+        raw_file (str): Audio descargado
+        output_file (str): Ruta del archivo final (.opus o .m4a)
+    
+    Returns:
+        bool: True si el archivo final se generó correctamente
+    """
+    extension = os.path.splitext(output_file)[1]
+    temp_file = f"{output_file}.tmp{extension}"
+    base_command = [
+        FFMPEG_PATH, '-y', '-loglevel', 'error',
+        '-i', raw_file,
+        '-vn', '-map', '0:a:0', '-map_metadata', '-1'
+    ]
+    attempts = [['-codec:a', 'copy']]
+    if extension.lstrip('.') in FALLBACK_CODECS:
+        attempts.append(FALLBACK_CODECS[extension.lstrip('.')])
+    
+    try:
+        for codec_args in attempts:
+            returncode, stderr = _run_ffmpeg(base_command + codec_args + [temp_file])
+            if returncode == 0:
+                os.replace(temp_file, output_file)
+                return True
             
-            if potential_files:
-                found_file = os.path.join(base_dir, potential_files[0])
-                
-                if found_file != output_file:
-                    if os.path.exists(output_file):
-                        os.remove(output_file)
-                    os.rename(found_file, output_file)
-            else:
-                return False
-        
-        # Verificar tamaño del archivo
-        file_size = os.path.getsize(output_file) / (1024*1024)
-        if file_size < 0.1:
-            return False
-        
-        # Intentar reparar el archivo MP3 si es necesario
-        fix_mp3_file(output_file)
-        
-        # Añadir metadatos al archivo MP3
-        metadata = get_basic_metadata(filename, cover_url, album_name)
-        
-        # Esperar un momento para asegurarse de que el archivo está disponible
-        time.sleep(1)
-        
-        add_metadata_to_file(output_file, metadata)
-        
-        return True
-    except Exception as e:
-        print(f"Error al descargar audio: {e}")
+            print(f"Error al preparar {raw_file} ({' '.join(codec_args)}): {stderr}")
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
         return False
+    finally:
+        if os.path.exists(raw_file):
+            os.remove(raw_file)
+
+def convert_audio(raw_file, output_file, metadata=None, cover_file=None):
+    """
+    Prepara el archivo final según su extensión: MP3 se convierte y el resto se copia
+    
+    Args:
+        raw_file (str): Audio descargado
+        output_file (str): Ruta del archivo final
+        metadata (dict, optional): Metadatos que ffmpeg escribe al convertir a MP3
+        cover_file (str, optional): Portada que ffmpeg incrusta al convertir a MP3
+    
+    Returns:
+        bool: True si el archivo final se generó correctamente
+    """
+    if output_file.lower().endswith('.mp3'):
+        return transcode_to_mp3(raw_file, output_file, metadata, cover_file)
+    return remux_audio(raw_file, output_file)
 
-def download_tracks(tracks, destino, root, shared_vars, cover_url=None, album_name=None):
+def tag_audio_file(output_file, metadata):
     """
-    Descarga una lista de pistas
+    Verifica el archivo de audio final y le añade los metadatos (etapa de disco)
     
     Args:
-        tracks (list): Lista de nombres de pistas
+        output_file (str): Ruta del archivo de audio
+        metadata (dict): Metadatos a añadir
+    
+    Returns:
+        bool: True si el archivo es válido
+    """
+    # Verificar tamaño del archivo
+    file_size = os.path.getsize(output_file) / (1024*1024)
+    if file_size < 0.1:
+        return False
+    
+    # Intentar reparar el archivo MP3 si es necesario
+    if output_file.lower().endswith('.mp3'):
+        fix_mp3_file(output_file)
+    
+    add_metadata_to_file(output_file, metadata)
+    return True
+
+# Solo un lote de descargas se ejecuta a la vez (descargas del usuario, sincronizaciones y reanudaciones)
+_download_lock = threading.Lock()
+
+def download_tracks(tracks, destino, root, shared_vars, cover_url=None, album_name=None, workers=DOWNLOAD_WORKERS,
+                    job_id=None, positions=None, source=None):
+    """
+    Descarga una lista de pistas con el pipeline por etapas (red, conversión y etiquetado)
+    
+    El avance de cada pista se guarda en la cola persistente de trabajos para
+    poder retomar la descarga si la aplicación se cierra a mitad.
+    
+    Args:
+        tracks (list): Lista de pistas (Track o texto "título - artistas")
         destino (str): Carpeta destino
         root (tk.Tk): Objeto raíz de tkinter
         shared_vars (dict): Variables compartidas
         cover_url (str, optional): URL de la imagen de portada
         album_name (str, optional): Nombre del álbum
+        workers (int, optional): Número de descargas simultáneas
+        job_id (int, optional): Trabajo guardado que se retoma; si no se indica se crea uno nuevo
+        positions (list, optional): Posición de cada pista dentro del trabajo retomado
+        source (str, optional): Playlist o álbum de origen (ver spotify_service.get_source_key)
     """
     # Normalizar la ruta de destino
     destino = os.path.normpath(destino)
     
+    tracks = list(tracks)
+    total = len(tracks)
+    
+    job_queue = get_job_queue()
+    if job_id is None:
+        job_id = job_queue.create_job(tracks, destino, cover_url, album_name, source)
+        positions = range(total)
+    positions = list(positions)
+    
+    # Un lote a la vez: dos pipelines sobre la misma carpeta comparten manifiesto,
+    # archivos temporales y rutas finales. El trabajo ya está en la cola, así que
+    # si la aplicación se cierra mientras espera se retomará al volver a abrirla
+    if not _download_lock.acquire(blocking=False):
+        root.after(0, lambda t=total: shared_vars['current_task'].set(f"En cola ({t} canciones)"))
+        root.after(0, lambda: shared_vars['status_text'].set("Esperando a que termine la descarga en curso..."))
+        _download_lock.acquire()
+    try:
+        _run_download_job(tracks, destino, root, shared_vars, cover_url, album_name, workers,
+                          job_queue, job_id, positions, source)
+    finally:
+        _download_lock.release()
+
+def _run_download_job(tracks, destino, root, shared_vars, cover_url, album_name, workers,
+                      job_queue, job_id, positions, source):
+    """Ejecuta el pipeline de un trabajo de la cola e informa del avance en la interfaz"""
+    from services.download_pipeline import DownloadPipeline
+    
     total = len(tracks)
-    for index, track_name in enumerate(tracks):
-        current = index + 1
-        # Usar variables locales en las lambdas para capturar correctamente los valores
-        current_num = current 
-        total_num = total
-        track_display = track_name
+    counts = {'done': 0}
+    counts_lock = threading.Lock()
+    
+    root.after(0, lambda t=total: shared_vars['current_task'].set(f"Descargando (0/{t})"))
+    root.after(0, lambda: shared_vars['progress_var'].set(0))
+    root.after(0, lambda: shared_vars['status_text'].set("Buscando en YouTube..."))
+    
+    stage_messages = {
+        'search': "Buscando en YouTube",
+        'network': "Descargando",
+        'transcode': "Convirtiendo",
+        'tag': "Añadiendo metadatos",
+    }
+    
+    job_states = {
+        'search': 'searching',
+        'network': 'downloading',
+        'transcode': 'transcoding',
+        'tag': 'tagging',
+        'done': 'done',
+        'skipped': 'done',
+        'failed': 'failed',
+    }
+    
+    def on_event(event, job):
+        track_display = str(job)
         
-        root.after(0, lambda c=current_num, t=total_num, n=track_display: 
-                    shared_vars['current_task'].set(f"Descargando ({c}/{t}): {n}"))
-        root.after(0, lambda c=current_num, t=total_num: 
-                    shared_vars['progress_var'].set((c / t) * 100))
-        root.after(0, lambda: 
-                    shared_vars['status_text'].set(f"Buscando en YouTube..."))
+        state = job_states.get(event)
+        if state:
+            try:
+                job_queue.set_state(job_id, positions[job.index], state, job.error if state == 'failed' else None)
+            except Exception as e:
+                print(f"Error al guardar el estado de la descarga: {e}")
         
-        try:
-            video = search_youtube(track_name)
-            if video:
-                video_url = video['link']
-                
-                root.after(0, lambda c=current_num, t=total_num: 
-                           shared_vars['status_text'].set(f"Descargando {c}/{t}..."))
-                
-                success = download_audio(video_url, destino, track_name, cover_url, album_name)
-                
-                if success:
-                    root.after(0, lambda n=track_display: 
-                               shared_vars['status_text'].set(f"Descarga completada: {n}"))
-                else:
-                    root.after(0, lambda n=track_display: 
-                               shared_vars['status_text'].set(f"Error al descargar: {n}"))
-            else:
-                root.after(0, lambda n=track_display: 
-                           shared_vars['status_text'].set(f"No se encontró: {n}"))
-        except Exception as e:
-            error_msg = str(e)
-            root.after(0, lambda err=error_msg: 
-                       shared_vars['status_text'].set(f"Error: {err}"))
-            time.sleep(2)
+        if event in stage_messages:
+            root.after(0, lambda m=stage_messages[event], n=track_display: 
+                       shared_vars['status_text'].set(f"{m}: {n}"))
+            return
+        
+        if event == 'done':
+            root.after(0, lambda n=track_display: 
+                       shared_vars['status_text'].set(f"Descarga completada: {n}"))
+        elif event == 'skipped':
+            root.after(0, lambda n=track_display: 
+                       shared_vars['status_text'].set(f"Ya descargada: {n}"))
+        else:
+            root.after(0, lambda n=track_display, err=job.error: 
+                       shared_vars['status_text'].set(f"Error al descargar: {n} ({err})"))
+        
+        with counts_lock:
+            counts['done'] += 1
+            done = counts['done']
+        
+        root.after(0, lambda c=done, t=total: 
+                    shared_vars['current_task'].set(f"Descargando ({c}/{t})"))
+        root.after(0, lambda c=done, t=total: 
+                    shared_vars['progress_var'].set((c / t) * 100))
+    
+    pipeline = DownloadPipeline(destino, cover_url, album_name, on_event=on_event, network_workers=workers,
+                                source=source)
+    ok, failed = pipeline.run(tracks)
+    skipped = pipeline.skipped
+    job_queue.finish_job(job_id)
+    
+    summary = f"Se completaron {ok + skipped} de {total} descargas ({skipped} ya existían, {failed} con error)"
+    if pipeline.transcoded:
+        tracks_per_minute, realtime_factor = pipeline.transcode_throughput()
+        throughput = f"conversión: {tracks_per_minute:.1f} pistas/min, {realtime_factor:.1f} s de audio por segundo"
+        print(f"Rendimiento de la {throughput}")
+        summary += f" · {throughput}"
     
     root.after(0, lambda: shared_vars['current_task'].set(f"Descarga finalizada"))
-    root.after(0, lambda: shared_vars['status_text'].set(f"Se completaron {total} descargas"))
+    root.after(0, lambda: shared_vars['status_text'].set(summary))
     
     # Mostrar mensaje final
-    if total > 1:
+    if failed:
+        root.after(0, lambda: messagebox.showwarning("Descarga completada", 
+                                                   f"Se descargaron {ok} de {total} canciones "
+                                                   f"({skipped} ya existían).\n"
+                                                   f"{failed} no se pudieron descargar."))
+    elif total > 1:
         root.after(0, lambda: messagebox.showinfo("Descarga completada", 
                                                 f"Se han descargado {total} canciones correctamente."))
     else:
         root.after(0, lambda: messagebox.showinfo("Descarga completada", 
-                                                "Canción descargada correctamente."))
\ No newline at end of file
+                                                "Canción descargada correctamente."))
+
+def resume_download_jobs(root, shared_vars):
+    """
+    Retoma las descargas que quedaron a medias en la última ejecución
+    
+    Los trabajos se procesan uno tras otro; de cada uno solo se descargan las
+    pistas que no llegaron a completarse ni a fallar.
+    
+    Args:
+        root (tk.Tk): Objeto raíz de tkinter
+        shared_vars (dict): Variables compartidas
+    """
+    job_queue = get_job_queue()
+    
+    for job in job_queue.unfinished_jobs():
+        if not job['tracks'] or not os.path.isdir(job['destino']):
+            job_queue.finish_job(job['id'])
+            continue
+        
+        print(f"Retomando la descarga en {job['destino']} ({len(job['tracks'])} pistas pendientes)")
+        download_tracks(job['tracks'], job['destino'], root, shared_vars, job['cover_url'], job['album_name'],
+                        job_id=job['id'], positions=job['positions'], source=job['source'])
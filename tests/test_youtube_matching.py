@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Pruebas de humo de la puntuación de resultados de YouTube
+"""
+import pytest
+
+pytest.importorskip("dotenv")
+pytest.importorskip("yt_dlp")
+pytest.importorskip("youtubesearchpython")
+
+from services.track import Track
+from services.youtube_service import score_candidate
+
+TRACK = Track("Bohemian Rhapsody", ["Queen"], duration_ms=354000)
+
+def candidate(title, duration="5:55", channel="Queen Official"):
+    """Resultado de VideosSearch con los campos que usa score_candidate"""
+    return {'title': title, 'duration': duration, 'channel': {'name': channel}}
+
+def test_official_upload_scores_high():
+    score = score_candidate(candidate("Queen - Bohemian Rhapsody (Official Video)"), TRACK)
+    assert score is not None and score > 0.8
+
+def test_full_hd_is_not_penalised():
+    plain = score_candidate(candidate("Queen - Bohemian Rhapsody (Official Video)"), TRACK)
+    full_hd = score_candidate(candidate("Queen - Bohemian Rhapsody (Official Video) [Full HD]"), TRACK)
+    assert full_hd == plain
+
+def test_alternative_versions_are_penalised():
+    official = score_candidate(candidate("Queen - Bohemian Rhapsody (Official Video)"), TRACK)
+    live = score_candidate(candidate("Queen - Bohemian Rhapsody (Live Aid 1985)"), TRACK)
+    assert live < official
+
+def test_full_album_is_penalised():
+    track = Track("Bohemian Rhapsody", ["Queen"])
+    official = score_candidate(candidate("Queen - Bohemian Rhapsody"), track)
+    album = score_candidate(candidate("Queen - Bohemian Rhapsody Full Album"), track)
+    assert album < official
+
+def test_duration_mismatch_is_rejected():
+    assert score_candidate(candidate("Queen - Bohemian Rhapsody", duration="10:30"), TRACK) is None
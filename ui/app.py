@@ -17,6 +17,7 @@ from ui.about_screen import AboutScreen  # Nueva pantalla para Acerca de
 from ui.player_screen import PlayerScreen  # Nueva pantalla para el reproductor
 from ui.styles import setup_styles
 from services.music_player_service import MusicPlayerService
+from services.youtube_service import resume_download_jobs
 
 class ListifyApp:
     """Clase principal de la aplicación con soporte para pantalla completa"""
@@ -88,6 +89,9 @@ class ListifyApp:
         
         # Iniciar con la pantalla de inicio
         self.mostrar_splash()
+        
+        # Retomar las descargas que quedaron a medias en la última ejecución
+        threading.Thread(target=resume_download_jobs, args=(self.root, self.shared_vars), daemon=True).start()
 
     def _setup_icon(self):
         """Configura el icono de la aplicación"""
@@ -7,11 +7,14 @@ import tkinter as tk
 from tkinter import ttk, messagebox
 import threading
 import webbrowser
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
-from config import SPOTIFY_BLACK, SPOTIFY_GREEN, SPOTIFY_DARK_GRAY, SPOTIFY_LIGHT_GRAY
-from services.spotify_service import search_spotify, get_tracks_from_url
+from config import SPOTIFY_BLACK, SPOTIFY_GREEN, SPOTIFY_DARK_GRAY, SPOTIFY_LIGHT_GRAY, DETAILS_DEBOUNCE_MS
+from services.spotify_service import search_spotify, iter_tracks_from_url, get_source_key
 from services.youtube_service import download_tracks
 from services.metadata_service import get_basic_metadata
+from services.track import Track, as_track
 
 class MainScreen:
     """Clase para la pantalla principal de la aplicación con nuevo layout"""
@@ -26,6 +29,23 @@ class MainScreen:
         # Variables adicionales para metadatos
         self.current_cover_url = None
         self.current_album_name = None
+        # Playlist o álbum de la URL importada, para anotarlo en el manifiesto de la carpeta
+        self.current_source = None
+        
+        # Elementos mostrados en la lista (Track o texto), en el mismo orden que sus filas
+        self.track_items = []
+        
+        # Identificador de la importación en curso (descarta lotes de importaciones anteriores)
+        self._fetch_id = 0
+        
+        # Carga de detalles: solo cuenta la última selección
+        self._pending_details = None
+        self._details_after_id = None
+        self._details_request_id = 0
+        self._details_executor = ThreadPoolExecutor(max_workers=1)
+        self._cover_images = OrderedDict()
+        # La caché la usan el hilo de detalles y el de la portada de la importación
+        self._cover_images_lock = threading.Lock()
         
         # Callbacks
         self.volver_callback = volver_callback
@@ -507,7 +527,51 @@ class MainScreen:
             borderwidth=0,
             command=self.descargar_playlist
         )
-        self.download_playlist_btn.pack(side=tk.LEFT)
+        self.download_playlist_btn.pack(side=tk.LEFT, padx=(0, 10))
+        
+        # Botón sincronizar la carpeta con la playlist de la URL
+        self.sync_btn = tk.Button(
+            self.download_buttons_frame, 
+            text="Sincronizar", 
+            font=("Helvetica", 10, "bold"),
+            bg=SPOTIFY_DARK_GRAY, 
+            fg="white", 
+            padx=15, 
+            pady=5,
+            borderwidth=0,
+            command=self.sincronizar_playlist
+        )
+        self.sync_btn.pack(side=tk.LEFT)
+        
+        # Opción de archivar las pistas que ya no están en la playlist
+        self.archive_removed_var = tk.BooleanVar(value=False)
+        self.archive_check = tk.Checkbutton(
+            self.download_buttons_frame,
+            text="Archivar eliminadas",
+            variable=self.archive_removed_var,
+            fg=SPOTIFY_LIGHT_GRAY,
+            bg=SPOTIFY_BLACK,
+            selectcolor=SPOTIFY_DARK_GRAY,
+            activebackground=SPOTIFY_BLACK,
+            activeforeground="white",
+            font=("Helvetica", 10),
+            borderwidth=0
+        )
+        self.archive_check.pack(side=tk.LEFT, padx=(10, 0))
+        
+        # Botón reescribir los metadatos de lo ya descargado en la carpeta destino
+        self.retag_btn = tk.Button(
+            self.download_buttons_frame, 
+            text="Reetiquetar", 
+            font=("Helvetica", 10, "bold"),
+            bg=SPOTIFY_DARK_GRAY, 
+            fg="white", 
+            padx=15, 
+            pady=5,
+            borderwidth=0,
+            command=self.reetiquetar_carpeta
+        )
+        self.retag_btn.pack(side=tk.LEFT, padx=(10, 0))
         
         # Estado de descarga
         self.download_status_label = tk.Label(
@@ -593,6 +657,7 @@ class MainScreen:
         # Mostrar indicador de carga
         self.shared_vars['status_text'].set("Obteniendo datos de Spotify...")
         self.track_list.delete(0, tk.END)
+        self.track_items = []
         self.shared_vars['playlist_title'].set("")
         self.cover_label.config(image="")
         self.shared_vars['progress_var'].set(20)
@@ -601,46 +666,93 @@ class MainScreen:
         # Reiniciar información de metadatos
         self.current_cover_url = None
         self.current_album_name = None
+        self.current_source = get_source_key(url)
         
         # Ejecutar en un hilo separado para no congelar la UI
-        threading.Thread(target=self._fetch_tracks_thread, args=(url,), daemon=True).start()
+        self._fetch_id += 1
+        threading.Thread(target=self._fetch_tracks_thread, args=(url, self._fetch_id), daemon=True).start()
     
-    def _fetch_tracks_thread(self, url):
-        """Hilo para obtener pistas de Spotify"""
-        tracks, cover_url, title = get_tracks_from_url(url)
-        
-        # Guardar información de metadatos
-        self.current_cover_url = cover_url
-        self.current_album_name = title
+    def _fetch_tracks_thread(self, url, fetch_id):
+        """Hilo para obtener pistas de Spotify, entregando cada página según llega"""
+        total = 0
+        try:
+            for batch, cover_url, title in iter_tracks_from_url(url):
+                if fetch_id != self._fetch_id:
+                    return
+                
+                if total == 0:
+                    # Guardar información de metadatos
+                    self.current_cover_url = cover_url
+                    self.current_album_name = title
+                    self.parent.after(0, lambda t=title: self._show_tracks_header(fetch_id, t))
+                    if cover_url:
+                        # La portada se descarga aparte para no retrasar las primeras pistas
+                        threading.Thread(target=self._fetch_header_cover, args=(fetch_id, cover_url),
+                                         daemon=True).start()
+                
+                total += len(batch)
+                # Actualizar la UI en el hilo principal
+                self.parent.after(0, lambda b=batch, n=total: self._append_tracks(fetch_id, b, n))
+        except ValueError as e:
+            self.parent.after(0, lambda err=str(e): messagebox.showerror("Error", err))
+        except Exception as e:
+            self.parent.after(0, lambda err=str(e): messagebox.showerror("Error", f"Error al obtener datos de Spotify: {err}"))
+        
+        self.parent.after(0, lambda: self._finish_tracks_ui(fetch_id, total))
+    
+    def _show_tracks_header(self, fetch_id, title):
+        """Mostrar el título de la playlist o álbum importado"""
+        if fetch_id != self._fetch_id:
+            return
         
-        # Actualizar la UI en el hilo principal
-        self.parent.after(0, lambda: self._update_tracks_ui(tracks, cover_url, title))
+        self.shared_vars['playlist_title'].set(title)
     
-    def _update_tracks_ui(self, tracks, cover_url, title):
-        """Actualizar la UI con las pistas obtenidas"""
-        if tracks:
-            for track in tracks:
-                self.track_list.insert(tk.END, track)
-            
-            self.shared_vars['playlist_title'].set(title)
+    def _fetch_header_cover(self, fetch_id, cover_url):
+        """Hilo para descargar y redimensionar la portada de la playlist o álbum importado"""
+        cover_img = self._load_cover_image(cover_url)
+        if cover_img is not None:
+            self.parent.after(0, lambda: self._show_header_cover(fetch_id, cover_img))
+    
+    def _show_header_cover(self, fetch_id, cover_img):
+        """Mostrar la portada ya procesada (el PhotoImage solo se crea en el hilo de la UI)"""
+        if fetch_id != self._fetch_id:
+            return
+        
+        try:
+            from PIL import ImageTk
             
-            if cover_url:
-                try:
-                    from PIL import Image, ImageTk
-                    import requests
-                    from io import BytesIO
-                    
-                    response = requests.get(cover_url)
-                    img_data = BytesIO(response.content)
-                    cover_img = Image.open(img_data).resize((150, 150), Image.LANCZOS)
-                    cover_photo = ImageTk.PhotoImage(cover_img)
-                    self.cover_label.config(image=cover_photo)
-                    self.cover_label.image = cover_photo
-                except Exception as e:
-                    print(f"Error al cargar la portada: {e}")
+            cover_photo = ImageTk.PhotoImage(cover_img)
+            self.cover_label.config(image=cover_photo)
+            self.cover_label.image = cover_photo
+        except Exception as e:
+            print(f"Error al cargar la portada: {e}")
+    
+    def _append_tracks(self, fetch_id, tracks, loaded):
+        """Añadir un lote de pistas a la lista mientras se cargan las siguientes"""
+        if fetch_id != self._fetch_id:
+            return
+        
+        self._insert_entries(tracks)
+        
+        self.shared_vars['status_text'].set(f"Cargando... {loaded} canciones")
+    
+    def _insert_entries(self, entries, nested=False):
+        """Añadir pistas o textos a la lista (nested muestra las pistas como viñetas bajo su álbum)"""
+        for entry in entries:
+            if isinstance(entry, Track):
+                text = f"  • {entry}" if nested else str(entry)
+            else:
+                text = entry
+            self.track_list.insert(tk.END, text)
+            self.track_items.append(entry)
+    
+    def _finish_tracks_ui(self, fetch_id, total):
+        """Marcar la importación como terminada"""
+        if fetch_id != self._fetch_id:
+            return
         
         self.shared_vars['progress_var'].set(100)
-        self.shared_vars['status_text'].set(f"Listo - {len(tracks)} canciones encontradas")
+        self.shared_vars['status_text'].set(f"Listo - {total} canciones encontradas")
         
         # Reiniciar la barra de progreso después de un tiempo
         self.parent.after(3000, lambda: self.shared_vars['progress_var'].set(0))
@@ -657,6 +769,7 @@ class MainScreen:
         # Mostrar indicador de carga
         self.shared_vars['status_text'].set(f"Buscando {search_type} en Spotify...")
         self.track_list.delete(0, tk.END)
+        self.track_items = []
         self.shared_vars['playlist_title'].set("")
         self.cover_label.config(image="")
         self.shared_vars['progress_var'].set(20)
@@ -665,8 +778,10 @@ class MainScreen:
         # Reiniciar información de metadatos
         self.current_cover_url = None
         self.current_album_name = None
+        self.current_source = None
         
         # Ejecutar en un hilo separado para no congelar la UI
+        self._fetch_id += 1
         threading.Thread(target=self._search_spotify_thread, 
                      args=(search_query, search_type), 
                      daemon=True).start()
@@ -685,8 +800,9 @@ class MainScreen:
     def _update_search_ui(self, results, cover_url, title):
         """Actualizar la UI con los resultados de búsqueda"""
         if results:
-            for item in results:
-                self.track_list.insert(tk.END, item)
+            # Las búsquedas de álbumes intercalan cabeceras "ÁLBUM:" con sus pistas
+            nested = any(isinstance(item, str) and item.startswith("ÁLBUM:") for item in results)
+            self._insert_entries(results, nested)
             
             self.shared_vars['playlist_title'].set(title)
             
@@ -713,11 +829,12 @@ class MainScreen:
     
     def descargar_cancion(self):
         """Descargar la canción seleccionada"""
-        selected_song = self.track_list.get(tk.ACTIVE)
-        if not selected_song:
+        if self.track_list.size() == 0:
             messagebox.showwarning("Advertencia", "Selecciona una canción para descargar.")
             return
         
+        selected_song = self.track_items[self.track_list.index(tk.ACTIVE)]
+        
         threading.Thread(target=self._descargar_audio, args=([selected_song],), daemon=True).start()
     
     def descargar_playlist(self):
@@ -726,9 +843,40 @@ class MainScreen:
             messagebox.showwarning("Advertencia", "No hay canciones en la lista.")
             return
         
-        tracks = [self.track_list.get(i) for i in range(self.track_list.size())]
+        tracks = list(self.track_items)
         threading.Thread(target=self._descargar_audio, args=(tracks,), daemon=True).start()
     
+    def sincronizar_playlist(self):
+        """Sincronizar la carpeta destino con la playlist de la URL"""
+        url = self.url_entry.get().strip()
+        if not url:
+            messagebox.showwarning("Advertencia", "Por favor ingresa una URL de Spotify.")
+            return
+        
+        destino = self.shared_vars['destino_var'].get()
+        if not destino or destino == "No seleccionado":
+            messagebox.showerror("Error", "Selecciona un destino primero.")
+            return
+        
+        from services.sync_service import sync_playlist
+        
+        threading.Thread(target=sync_playlist, 
+                         args=(url, destino, self.parent, self.shared_vars, self.archive_removed_var.get()), 
+                         daemon=True).start()
+    
+    def reetiquetar_carpeta(self):
+        """Reescribir los metadatos de las pistas ya descargadas en la carpeta destino"""
+        destino = self.shared_vars['destino_var'].get()
+        if not destino or destino == "No seleccionado":
+            messagebox.showerror("Error", "Selecciona un destino primero.")
+            return
+        
+        from services.retag_service import retag_folder
+        
+        threading.Thread(target=retag_folder, 
+                         args=(destino, self.parent, self.shared_vars), 
+                         daemon=True).start()
+    
     def _descargar_audio(self, tracks):
         """Proceso de descarga de audio en segundo plano"""
         destino = self.shared_vars['destino_var'].get()
@@ -744,7 +892,8 @@ class MainScreen:
         album_name = self.current_album_name if use_metadata else None
         
         # Descargar las pistas
-        download_tracks(tracks, destino, self.parent, self.shared_vars, cover_url, album_name)
+        download_tracks(tracks, destino, self.parent, self.shared_vars, cover_url, album_name,
+                        source=self.current_source)
     
     def _on_track_select(self, event):
         """Actualiza los detalles de la canción cuando se selecciona una pista"""
@@ -752,40 +901,89 @@ class MainScreen:
             return
         
         selected_index = self.track_list.curselection()[0]
-        track_name = self.track_list.get(selected_index)
+        track = self.track_items[selected_index]
         
-        # Ignorar categorías o separadores (líneas que comienzan con espacios o contienen ÁLBUM:)
-        if track_name.strip().startswith("•") or "ÁLBUM:" in track_name:
+        # Ignorar categorías o separadores (cabeceras ÁLBUM:)
+        if isinstance(track, str) and "ÁLBUM:" in track:
             return
         
         # Mostrar indicador de carga
         self.shared_vars['status_text'].set("Cargando detalles de la canción...")
         
-        # Ejecutar en un hilo separado
-        threading.Thread(target=self._fetch_track_details, args=(track_name,), daemon=True).start()
+        # Agrupar selecciones rápidas (p. ej. mantener pulsada una flecha): solo se carga la última
+        self._pending_details = track
+        if self._details_after_id is not None:
+            self.parent.after_cancel(self._details_after_id)
+        self._details_after_id = self.parent.after(DETAILS_DEBOUNCE_MS, self._load_pending_details)
+    
+    def _load_pending_details(self):
+        """Lanza la carga de detalles de la última pista seleccionada"""
+        self._details_after_id = None
+        track = self._pending_details
+        self._pending_details = None
+        if track is None:
+            return
+        
+        self._details_request_id += 1
+        self._details_executor.submit(self._fetch_track_details, track, self._details_request_id)
 
-    def _fetch_track_details(self, track_name):
+    def _fetch_track_details(self, track, request_id):
         """Obtiene los detalles de una canción en segundo plano"""
         from services.spotify_service import get_track_details
         
-        details = get_track_details(track_name)
+        # Una selección más reciente deja obsoleta esta petición
+        if request_id != self._details_request_id:
+            return
+        
+        details = get_track_details(track)
+        
+        cover_img = None
+        if details and details['album']['images'] and request_id == self._details_request_id:
+            # Usar la primera imagen (generalmente la de mayor resolución)
+            cover_img = self._load_cover_image(details['album']['images'][0])
         
         # Actualizar la UI en el hilo principal
-        self.parent.after(0, lambda: self._update_track_details_ui(track_name, details))
+        self.parent.after(0, lambda: self._update_track_details_ui(track, details, cover_img, request_id))
 
-    def _update_track_details_ui(self, track_name, details):
+    def _load_cover_image(self, cover_url):
+        """Descarga y redimensiona una portada, reutilizando las ya cargadas"""
+        with self._cover_images_lock:
+            if cover_url in self._cover_images:
+                self._cover_images.move_to_end(cover_url)
+                return self._cover_images[cover_url]
+        
+        try:
+            from PIL import Image
+            import requests
+            from io import BytesIO
+            
+            response = requests.get(cover_url)
+            img_data = BytesIO(response.content)
+            cover_img = Image.open(img_data).resize((150, 150), Image.LANCZOS)
+        except Exception as e:
+            print(f"Error al cargar la portada: {e}")
+            return None
+        
+        with self._cover_images_lock:
+            self._cover_images[cover_url] = cover_img
+            if len(self._cover_images) > 64:
+                self._cover_images.popitem(last=False)
+        return cover_img
+
+    def _update_track_details_ui(self, track, details, cover_img, request_id):
         """Actualiza la interfaz con los detalles de la canción"""
+        if request_id != self._details_request_id:
+            return
+        
         # Reiniciar estado
         self.shared_vars['status_text'].set("Listo")
         
         if not details:
             # Mostrar información básica si no hay detalles disponibles
-            parts = track_name.split(" - ", 1)
-            title = parts[0].strip()
-            artist = parts[1].strip() if len(parts) > 1 else "Desconocido"
+            track = as_track(track)
             
-            self.shared_vars['playlist_title'].set(title)
-            self.artist_label.config(text=artist)
+            self.shared_vars['playlist_title'].set(track.title)
+            self.artist_label.config(text=track.artist or "Desconocido")
             self.album_label.config(text="N/A")
             self.release_label.config(text="N/A")
             self.duration_label.config(text="N/A")
@@ -797,21 +995,14 @@ class MainScreen:
             self.album_label.config(text=details['album']['name'])
             self.release_label.config(text=details['album']['release_date'])
             self.duration_label.config(text=details['duration'])
-            self.popularity_label.config(text=f"{details['popularity']}/100")
+            popularity = details['popularity']
+            self.popularity_label.config(text=f"{popularity}/100" if popularity is not None else "N/A")
             
             # Actualizar portada si hay imágenes disponibles
-            if details['album']['images']:
+            if cover_img is not None:
                 try:
-                    from PIL import Image, ImageTk
-                    import requests
-                    from io import BytesIO
-                    
-                    # Usar la primera imagen (generalmente la de mayor resolución)
-                    cover_url = details['album']['images'][0]
+                    from PIL import ImageTk
                     
-                    response = requests.get(cover_url)
-                    img_data = BytesIO(response.content)
-                    cover_img = Image.open(img_data).resize((150, 150), Image.LANCZOS)
                     cover_photo = ImageTk.PhotoImage(cover_img)
                     self.cover_label.config(image=cover_photo)
                     self.cover_label.image = cover_photo  # Mantener referencia
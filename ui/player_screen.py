@@ -362,11 +362,11 @@ class PlayerScreen:
         """Carga las canciones de la carpeta seleccionada"""
         self.song_list.delete(0, tk.END)
         
-        # Buscar archivos MP3 en la carpeta
+        # Buscar archivos de audio en la carpeta
         mp3_files = self.player.scan_directory(folder)
         
         if not mp3_files:
-            self.song_list.insert(tk.END, "No se encontraron archivos MP3")
+            self.song_list.insert(tk.END, "No se encontraron archivos de audio")
             return
         
         # Cargar la playlist en el reproductor